@@ -13,4 +13,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cf.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up. The incoming alert stream is served in
+# front of Django's handler so idle clients do not each hold a thread. In
+# production only the alerts URL is routed here, pages are served by WSGI.
+from posts.alerts import AlertsApplication  # noqa: E402
+
+application = AlertsApplication(django_application)
@@ -0,0 +1,110 @@
+"""
+Routing between the primary database and its read replicas.
+
+Writes always go to the primary. Reads go to a replica only inside
+``replica_reads()``, which views that can live with replication lag opt
+into through ReplicaReadMixin. A session that wrote anything is pinned to
+the primary for DATABASE_REPLICA_PIN_SECONDS afterwards, so people see
+their own changes straight away.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+PRIMARY = "default"
+PIN_SESSION_KEY = "_db_primary_until"
+
+# Always read from the primary: users and sessions are cached after they
+# are read and the job queue locks its rows.
+PRIMARY_APPS = {"auth", "contenttypes", "jobs", "sessions", "users"}
+
+_replica = ContextVar("db_replica", default=None)
+_writes = ContextVar("db_writes", default=None)
+
+
+def is_pinned(request):
+    session = getattr(request, "session", None)
+    return bool(session) and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+@contextmanager
+def replica_reads(request):
+    """Read from one replica, picked for the whole block, unless pinned."""
+    replicas = settings.DATABASE_REPLICAS
+    alias = random.choice(replicas) if replicas and not is_pinned(request) else None
+    token = _replica.set(alias)
+    try:
+        yield alias or PRIMARY
+    finally:
+        _replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or model._meta.app_label in PRIMARY_APPS:
+            return PRIMARY
+        # Follow relations on the database the instance was read from.
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db in settings.DATABASE_REPLICAS:
+            return instance._state.db
+        return alias
+
+    def db_for_write(self, model, **hints):
+        writes = _writes.get()
+        if writes is not None:
+            writes.add(model._meta.label)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return db == PRIMARY
+
+
+class PinPrimaryAfterWriteMiddleware:
+    """
+    Pin the session to the primary after a request that wrote to it.
+
+    Goes after SessionMiddleware, so saving the session itself does not
+    count as a write.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = set()
+        token = _writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _writes.reset(token)
+        if writes and settings.DATABASE_REPLICAS and hasattr(request, "session"):
+            request.session[PIN_SESSION_KEY] = (
+                time.time() + settings.DATABASE_REPLICA_PIN_SECONDS
+            )
+        return response
+
+
+class ReplicaReadMixin:
+    """Serve GET and HEAD requests from a read replica."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads(request):
+            response = super().dispatch(request, *args, **kwargs)
+            # Templates can still run queries, render while on the replica.
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+        return response
@@ -39,13 +39,18 @@ INSTALLED_APPS = [
     "crispy_bootstrap5",
     "users",
     "posts",
+    "jobs",
+    "metrics",
 ]
 
 MIDDLEWARE = [
+    "cf.streaming.AsyncStreamingMiddleware",
+    "metrics.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
+    "cf.routers.PinPrimaryAfterWriteMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
@@ -55,7 +60,7 @@ ROOT_URLCONF = "cf.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": "metrics.templates.TimedDjangoTemplates",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -93,6 +98,59 @@ else:
             "PORT": os.environ.get("SQL_PORT", "5432"),
         }
     }
+
+# Read replicas: comma separated hosts for PostgreSQL, or database files for
+# SQLite (a copy of db.sqlite3 is enough to try it locally). The list, detail,
+# timeline and export pages read from one of them, everything else and any
+# session that wrote in the last DATABASE_REPLICA_PIN_SECONDS seconds uses
+# the primary (see cf.routers).
+DATABASE_REPLICAS = []
+for number, replica in enumerate(
+    filter(None, map(str.strip, os.environ.get("SQL_REPLICAS", "").split(","))),
+    start=1,
+):
+    alias = f"replica{number}"
+    location = "NAME" if "sqlite3" in DATABASES["default"]["ENGINE"] else "HOST"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        location: replica,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+DATABASE_ROUTERS = ["cf.routers.PrimaryReplicaRouter"]
+# Longer than the replicas normally lag behind.
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get("SQL_REPLICA_PIN_SECONDS", 10))
+
+# Cache
+# Shared by every worker through Redis when REDIS_URL is set, otherwise
+# local to the process.
+
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Sessions are read from the cache and written through to the database, so
+# a cache flush only costs a database read. A process-local cache would let
+# the other workers keep a session after logout, so without Redis sessions
+# are read from the database.
+SESSION_ENGINE = (
+    "django.contrib.sessions.backends.cached_db"
+    if REDIS_URL
+    else "django.contrib.sessions.backends.db"
+)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -148,13 +206,90 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "mediafiles"
 
+# Media is not served publicly. Downloads go through a view that checks
+# access, then hands the transfer to nginx's internal location with
+# X-Accel-Redirect. Without nginx the view streams the file itself.
+PROTECTED_MEDIA_URL = "/protected-media/"
+PROTECTED_MEDIA_X_ACCEL = bool(
+    int(os.environ.get("PROTECTED_MEDIA_X_ACCEL", default=int(not DEBUG)))
+)
+
+# Documents are stored once per content hash under blobs/ab/cd/, hashed
+# while the upload streams in.
+STORAGES = {
+    "default": {
+        "BACKEND": "posts.storage.ContentAddressedStorage",
+    },
+    "staticfiles": {
+        # Fingerprinted, precompressed files for nginx outside DEBUG, which
+        # needs collectstatic to have run.
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage"
+            if DEBUG
+            else "cf.storage.CompressedManifestStaticFilesStorage"
+        ),
+    },
+}
+FILE_UPLOAD_HANDLERS = [
+    "posts.storage.HashingMemoryFileUploadHandler",
+    "posts.storage.HashingTemporaryFileUploadHandler",
+]
+# Seconds a blob file nothing references is kept after it was last stored
+# or reused, so an upload of the same content can still take it.
+BLOB_DELETE_GRACE = 15 * 60
+
+# Chunked uploads for large scans, parts are assembled next to MEDIA_ROOT so
+# attaching a finished upload is a rename on the same filesystem.
+CHUNKED_UPLOAD_DIR = MEDIA_ROOT / "chunked_uploads"
+CHUNKED_UPLOAD_CHUNK_SIZE = 2 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_SIZE = 1024 * 1024 * 1024
+
+# Document previews, rendered by the job worker (see posts.previews).
+PREVIEW_THUMBNAIL_SIZE = 200
+PREVIEW_SIZE = 1000
+PREVIEW_TIMEOUT = 60
+
+# Text pulled out of documents for search (see posts.extraction).
+EXTRACTED_TEXT_MAX_LENGTH = 1_000_000
+EXTRACTION_TIMEOUT = 120
+
+# Archived correspondence (see posts.archive): documents are recompressed
+# with xz into ARCHIVE_ROOT, which can live on slower, cheaper storage.
+ARCHIVE_ROOT = os.environ.get("ARCHIVE_ROOT", BASE_DIR / "archive")
+ARCHIVE_AFTER_YEARS = 7
+ARCHIVE_COMPRESSION_PRESET = 9
+
+# Live alerts for urgent and confidential letters (see posts.alerts), in
+# seconds. The poll interval only applies to databases without LISTEN/NOTIFY.
+INCOMING_ALERTS_POLL_INTERVAL = 2
+INCOMING_ALERTS_HEARTBEAT = 15
+INCOMING_ALERTS_RETRY = 5
+INCOMING_ALERTS_QUEUE_SIZE = 100
+
+# Seconds finished background jobs are kept for inspection. Failed ones are
+# kept longer, to be looked into.
+JOBS_DONE_RETENTION = 60 * 60
+JOBS_FAILED_RETENTION = 7 * 24 * 60 * 60
+
+# Bearer token Prometheus sends for /metrics (see metrics.views). Without
+# one the endpoint refuses every request.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 # Custom user model
 AUTH_USER_MODEL = "users.User"
 
+# EmailOrUsernameBackend extends ModelBackend, so it also answers permission
+# checks and is the only backend needed.
 AUTHENTICATION_BACKENDS = [
-    "django.contrib.auth.backends.ModelBackend",
     "users.backends.EmailOrUsernameBackend",
 ]
+# Seconds a login identifier that matched no account is remembered for, and
+# the logged in user (with its department) is cached for between requests.
+# User.save, Department.save and User.objects.update() clear them early,
+# which only reaches every worker through Redis: without it, 0 turns both
+# caches off.
+AUTH_UNKNOWN_IDENTIFIER_TIMEOUT = 60 if REDIS_URL else 0
+AUTH_USER_CACHE_TIMEOUT = 300 if REDIS_URL else 0
 PASSWORD_RESET_TIMEOUT = 3600
 
 SITE_ID = 1
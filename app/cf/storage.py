@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Formats worth compressing; images and fonts already are.
+COMPRESSIBLE_EXTENSIONS = {
+    ".css",
+    ".js",
+    ".map",
+    ".json",
+    ".svg",
+    ".txt",
+    ".xml",
+    ".html",
+    ".ico",
+}
+
+# Smaller files are not worth a second request to disk.
+MIN_COMPRESS_SIZE = 512
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Fingerprint collected files and write ``.gz`` and ``.br`` copies next to
+    them, for nginx's gzip_static and brotli_static.
+
+    A reference to a file that does not exist, from a template or a
+    stylesheet, keeps its plain URL instead of failing the page or the
+    collectstatic run.
+    """
+
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        if content is None and not self.exists(self.clean_name(filename or name)):
+            return name
+        return super().hashed_name(name, content, filename)
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed_names = set()
+        for name, hashed_name, processed in super().post_process(
+            paths, dry_run, **options
+        ):
+            if isinstance(processed, Exception):
+                yield name, hashed_name, processed
+                continue
+            processed_names.update([name, hashed_name])
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        # The plain and fingerprinted copies usually share content, compress
+        # it once.
+        compressed = {}
+        for name in sorted(filter(None, processed_names)):
+            self.compress(name, compressed)
+
+    def compress(self, name, compressed):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            return
+        path = self.path(name)
+        with open(path, "rb") as file:
+            content = file.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        digest = hashlib.sha256(content).digest()
+        if digest not in compressed:
+            # mtime=0 keeps the output, and so the deploy, reproducible.
+            compressed[digest] = (
+                gzip.compress(content, 9, mtime=0),
+                brotli.compress(content) if brotli is not None else None,
+            )
+        gzipped, brotlied = compressed[digest]
+        self.write_smaller(path + ".gz", content, gzipped)
+        if brotlied is not None:
+            self.write_smaller(path + ".br", content, brotlied)
+
+    def write_smaller(self, path, content, compressed):
+        if len(compressed) >= len(content):
+            return
+        with open(path, "wb") as file:
+            file.write(compressed)
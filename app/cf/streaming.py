@@ -0,0 +1,50 @@
+"""
+Streaming responses under ASGI.
+
+Django's ASGI handler reads a synchronous ``streaming_content`` whole into
+memory before it sends any of it, which undoes the flat memory use of the
+exports and file downloads. AsyncStreamingMiddleware hands it an async
+iterator instead, which reads the original iterator in the sync thread a
+batch at a time. Under WSGI responses are left as they are.
+"""
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+# Roughly what is read per trip to the sync thread.
+BATCH_SIZE = 64 * 1024
+
+
+def read_batch(iterator, size):
+    parts, length = [], 0
+    for part in iterator:
+        parts.append(part)
+        length += len(part)
+        if length >= size:
+            break
+    return b"".join(parts)
+
+
+async def iterate_async(iterator):
+    # The thread-sensitive default keeps database cursors on the thread that
+    # opened them.
+    read = sync_to_async(read_batch)
+    while data := await read(iterator, BATCH_SIZE):
+        yield data
+
+
+class AsyncStreamingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            isinstance(request, ASGIRequest)
+            and response.streaming
+            and not response.is_async
+        ):
+            # The original iterator's close() stays registered on the
+            # response and still runs when the response is closed.
+            response.streaming_content = iterate_async(response.streaming_content)
+        return response
@@ -0,0 +1,94 @@
+import gzip
+import os
+import shutil
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.db import router
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from posts.models import Incoming
+from users.models import User
+
+from .routers import PIN_SESSION_KEY, replica_reads
+
+
+class CompressedManifestStaticFilesStorageTest(SimpleTestCase):
+    def setUp(self):
+        self.static_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_root)
+
+    def test_collectstatic_writes_compressed_fingerprinted_files(self):
+        storages = {
+            "staticfiles": {
+                "BACKEND": "cf.storage.CompressedManifestStaticFilesStorage"
+            }
+        }
+        # Only the project's own files, the admin's take long to compress.
+        finders = ["django.contrib.staticfiles.finders.FileSystemFinder"]
+        with override_settings(
+            STATIC_ROOT=self.static_root,
+            STORAGES=storages,
+            STATICFILES_FINDERS=finders,
+        ):
+            call_command("collectstatic", interactive=False, verbosity=0)
+
+        names = os.listdir(os.path.join(self.static_root, "css"))
+        hashed = next(
+            name
+            for name in names
+            if name.startswith("bootstrap.min.")
+            and name.endswith(".css")
+            and name != "bootstrap.min.css"
+        )
+        self.assertIn(f"{hashed}.gz", names)
+        self.assertIn(f"{hashed}.br", names)
+        path = os.path.join(self.static_root, "css", hashed)
+        with open(path, "rb") as file, gzip.open(f"{path}.gz") as compressed:
+            self.assertEqual(compressed.read(), file.read())
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"])
+class PrimaryReplicaRouterTest(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get("/")
+        self.request.session = {}
+
+    def test_reads_use_the_replica_only_when_asked(self):
+        self.assertEqual(router.db_for_read(Incoming), "default")
+        with replica_reads(self.request):
+            self.assertEqual(router.db_for_read(Incoming), "replica1")
+            self.assertEqual(router.db_for_read(User), "default")
+            self.assertEqual(router.db_for_write(Incoming), "default")
+        self.assertEqual(router.db_for_read(Incoming), "default")
+
+    def test_pinned_session_reads_from_the_primary(self):
+        self.request.session[PIN_SESSION_KEY] = time.time() + 10
+        with replica_reads(self.request):
+            self.assertEqual(router.db_for_read(Incoming), "default")
+
+    def test_writing_pins_the_session(self):
+        user = User.objects.create(
+            username="registry", email="registry@example.com", is_creator=True
+        )
+        incoming = Incoming.objects.create(
+            created_by=user,
+            updated_by=user,
+            r_from="Ministry of Finance",
+            dated="2024-01-01",
+            subject="Letter",
+            file="incoming/letter.pdf",
+        )
+        self.client.force_login(user)
+        self.client.get(reverse("user-detail"))
+        self.assertNotIn(PIN_SESSION_KEY, self.client.session)
+
+        self.client.post(
+            reverse("incoming-add-comment", args=[incoming.slug]),
+            {"comment": "Seen."},
+        )
+        self.assertGreater(self.client.session[PIN_SESSION_KEY], time.time())
+        # replica1 is not a real database: only the primary can answer.
+        response = self.client.get(reverse("incoming-detail", args=[incoming.slug]))
+        self.assertContains(response, "Seen.")
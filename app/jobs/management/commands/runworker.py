@@ -0,0 +1,98 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from jobs import queue
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=2,
+            help="Number of jobs run at the same time (one thread each).",
+        )
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument("--poll-interval", type=float, default=2.0)
+        parser.add_argument(
+            "--stale-after",
+            type=int,
+            default=15 * 60,
+            help="Seconds after which a running job is assumed lost and requeued.",
+        )
+        parser.add_argument(
+            "--maintenance-interval",
+            type=float,
+            default=60.0,
+            help="Seconds between requeueing stale jobs and purging finished ones.",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the queue once and exit."
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *args: self.stopping.set())
+        signal.signal(signal.SIGINT, lambda *args: self.stopping.set())
+
+        name = f"{socket.gethostname()}:{os.getpid()}"
+        self.maintain(options)
+
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(f"{name}:{i}", options),
+                daemon=True,
+            )
+            for i in range(options["concurrency"])
+        ]
+        self.stdout.write(f"Worker {name} started with {len(threads)} threads.")
+        for thread in threads:
+            thread.start()
+        # The main thread looks after the queue while the others run jobs:
+        # other workers' jobs can go stale at any time, not only at startup.
+        next_maintenance = time.monotonic() + options["maintenance_interval"]
+        try:
+            while any(thread.is_alive() for thread in threads):
+                if self.stopping.wait(options["poll_interval"]):
+                    break
+                if time.monotonic() >= next_maintenance:
+                    self.maintain(options)
+                    next_maintenance = (
+                        time.monotonic() + options["maintenance_interval"]
+                    )
+            for thread in threads:
+                thread.join()
+        finally:
+            connection.close()
+
+    def maintain(self, options):
+        close_old_connections()
+        requeued = queue.requeue_stale(options["stale_after"])
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale jobs.")
+        purged = queue.purge_finished()
+        if purged:
+            self.stdout.write(f"Deleted {purged} finished jobs.")
+
+    def work(self, name, options):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                jobs = queue.claim(name, options["batch_size"])
+                if jobs:
+                    queue.run_batch(jobs)
+                elif options["once"]:
+                    break
+                else:
+                    self.stopping.wait(options["poll_interval"])
+        finally:
+            connection.close()
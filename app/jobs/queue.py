@@ -0,0 +1,170 @@
+import datetime
+import logging
+import random
+import threading
+import traceback
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+_local = threading.local()
+
+
+def task(func=None, *, max_attempts=5):
+    """
+    Register ``func`` as a background task.
+
+    The function gets an ``enqueue(*args, **kwargs)`` attribute that stores
+    a Job row; arguments must be JSON serializable.
+    """
+
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        _registry[name] = func
+
+        def enqueue(*args, run_at=None, **kwargs):
+            return Job.objects.create(
+                task=name,
+                args=list(args),
+                kwargs=kwargs,
+                max_attempts=max_attempts,
+                run_at=run_at or timezone.now(),
+            )
+
+        func.task_name = name
+        func.enqueue = enqueue
+        return func
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def get_task(name):
+    if name not in _registry:
+        # Importing the module runs its @task decorators.
+        import_string(name)
+    if name not in _registry:
+        raise LookupError(f"{name} is not a registered task.")
+    return _registry[name]
+
+
+def get_mail_connection():
+    """
+    The SMTP connection shared by every job in the current worker batch,
+    or None outside a worker so callers open their own.
+    """
+    batch = getattr(_local, "batch", None)
+    if batch is None:
+        return None
+    if batch.get("mail") is None:
+        batch["mail"] = get_connection()
+        batch["mail"].open()
+    return batch["mail"]
+
+
+class batch_context:
+    def __enter__(self):
+        _local.batch = {}
+        return self
+
+    def __exit__(self, *exc_info):
+        batch, _local.batch = _local.batch, None
+        if batch.get("mail") is not None:
+            batch["mail"].close()
+
+
+def backoff(attempts):
+    base = getattr(settings, "JOBS_RETRY_BACKOFF", 30)
+    delay = min(base * 2 ** (attempts - 1), 6 * 60 * 60)
+    return datetime.timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def requeue_stale(timeout):
+    """Put back jobs whose worker died while running them."""
+    cutoff = timezone.now() - datetime.timedelta(seconds=timeout)
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff).update(
+        status=Job.QUEUED, locked_at=None, locked_by=""
+    )
+
+
+def purge_finished():
+    """
+    Delete finished jobs past their retention. Their arguments can hold
+    live links, such as those of password reset emails.
+    """
+    now = timezone.now()
+    done_before = now - datetime.timedelta(seconds=settings.JOBS_DONE_RETENTION)
+    failed_before = now - datetime.timedelta(seconds=settings.JOBS_FAILED_RETENTION)
+    return Job.objects.filter(
+        Q(status=Job.DONE, updated_at__lt=done_before)
+        | Q(status=Job.FAILED, updated_at__lt=failed_before)
+    ).delete()[0]
+
+
+def claim(worker_name, limit):
+    now = timezone.now()
+    pks = list(
+        Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        .order_by("run_at", "id")
+        .values_list("pk", flat=True)[:limit]
+    )
+    # The status condition makes the UPDATE the lock: a job another worker
+    # claimed in the meantime is simply not updated here.
+    Job.objects.filter(pk__in=pks, status=Job.QUEUED).update(
+        status=Job.RUNNING, locked_at=now, locked_by=worker_name
+    )
+    return list(
+        Job.objects.filter(
+            pk__in=pks, status=Job.RUNNING, locked_by=worker_name, locked_at=now
+        ).order_by("run_at", "id")
+    )
+
+
+def run_job(job):
+    job.attempts += 1
+    try:
+        get_task(job.task)(*job.args, **job.kwargs)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            logger.exception("Job %s (%s) failed permanently", job.pk, job.task)
+        else:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + backoff(job.attempts)
+            logger.warning("Job %s (%s) failed, retrying", job.pk, job.task)
+        # A broken SMTP connection should not fail the rest of the batch.
+        batch = getattr(_local, "batch", None)
+        if batch and batch.get("mail") is not None:
+            batch.pop("mail").close()
+    else:
+        job.status = Job.DONE
+        job.last_error = ""
+    job.locked_at = None
+    job.locked_by = ""
+    job.save(
+        update_fields=[
+            "attempts",
+            "status",
+            "run_at",
+            "last_error",
+            "locked_at",
+            "locked_by",
+            "updated_at",
+        ]
+    )
+
+
+def run_batch(jobs):
+    with batch_context():
+        for job in jobs:
+            run_job(job)
@@ -0,0 +1,68 @@
+import datetime
+
+from django.core import mail
+from django.test import TestCase
+from django.utils import timezone
+
+from users.tasks import forgot_password_email
+
+from . import queue
+from .models import Job
+
+calls = []
+
+
+@queue.task(max_attempts=2)
+def flaky_task(value):
+    calls.append(value)
+    if len(calls) == 1:
+        raise RuntimeError("first attempt fails")
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_retry_with_backoff(self):
+        job = flaky_task.enqueue("x")
+        queue.run_batch(queue.claim("test", 10))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertIn("first attempt fails", job.last_error)
+        # Not due yet, so nothing is claimed.
+        self.assertEqual(queue.claim("test", 10), [])
+
+        Job.objects.update(run_at=job.created_at)
+        queue.run_batch(queue.claim("test", 10))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(calls, ["x", "x"])
+
+    def test_batch_shares_one_mail_connection(self):
+        for i in range(3):
+            forgot_password_email.enqueue(f"user{i}@example.com", "Reset", "Body")
+        jobs = queue.claim("test", 10)
+        self.assertEqual(len(jobs), 3)
+        with queue.batch_context():
+            connection = queue.get_mail_connection()
+            for job in jobs:
+                queue.run_job(job)
+            self.assertIs(queue.get_mail_connection(), connection)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(Job.objects.exclude(status=Job.DONE).exists())
+
+    def test_purge_finished(self):
+        forgot_password_email.enqueue("user@example.com", "Reset", "Body")
+        queue.run_batch(queue.claim("test", 10))
+        queued = flaky_task.enqueue("x")
+        failed = flaky_task.enqueue("y")
+        Job.objects.filter(pk=failed.pk).update(status=Job.FAILED)
+        self.assertEqual(queue.purge_finished(), 0)
+
+        # A day later only the failed job is still kept.
+        Job.objects.update(updated_at=timezone.now() - datetime.timedelta(days=1))
+        self.assertEqual(queue.purge_finished(), 1)
+        self.assertCountEqual(
+            Job.objects.values_list("pk", flat=True), [queued.pk, failed.pk]
+        )
@@ -0,0 +1,36 @@
+from prometheus_client import Counter, Histogram
+
+# Collectors are module level so every gunicorn worker registers them once;
+# with PROMETHEUS_MULTIPROC_DIR set their samples go to shared files.
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUEST_LATENCY = Histogram(
+    "django_http_request_duration_seconds",
+    "Time spent handling a request, by URL name.",
+    ["view", "method"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "django_http_requests_total",
+    "Requests handled, by URL name and response status.",
+    ["view", "method", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "django_http_request_sql_queries",
+    "SQL queries run per request, by URL name.",
+    ["view"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+REQUEST_SQL_TIME = Histogram(
+    "django_http_request_sql_duration_seconds",
+    "Total SQL time per request, by URL name.",
+    ["view"],
+    buckets=LATENCY_BUCKETS,
+)
+TEMPLATE_RENDER_TIME = Histogram(
+    "django_template_render_duration_seconds",
+    "Time spent rendering a top-level template, by template name.",
+    ["template"],
+    buckets=LATENCY_BUCKETS,
+)
@@ -0,0 +1,69 @@
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.urls import get_resolver
+
+from .collectors import (
+    REQUEST_LATENCY,
+    REQUEST_QUERIES,
+    REQUEST_SQL_TIME,
+    REQUESTS,
+)
+
+
+class QueryRecorder:
+    """connection.execute_wrapper that counts and times every query."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def url_names(resolver=None, namespace=""):
+    resolver = resolver or get_resolver()
+    for pattern in resolver.url_patterns:
+        if hasattr(pattern, "url_patterns"):
+            prefix = f"{namespace}{pattern.namespace}:" if pattern.namespace else namespace
+            yield from url_names(pattern, prefix)
+        elif pattern.name:
+            yield f"{namespace}{pattern.name}"
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Export a series for every named view from the start, so dashboards
+        # show idle views as zero instead of missing.
+        for name in url_names():
+            REQUEST_QUERIES.labels(view=name)
+            REQUEST_SQL_TIME.labels(view=name)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match and match.view_name else "<unresolved>"
+        if view == "metrics":
+            return response
+        REQUEST_LATENCY.labels(view=view, method=request.method).observe(duration)
+        REQUESTS.labels(
+            view=view, method=request.method, status=response.status_code
+        ).inc()
+        REQUEST_QUERIES.labels(view=view).observe(recorder.count)
+        REQUEST_SQL_TIME.labels(view=view).observe(recorder.duration)
+        return response
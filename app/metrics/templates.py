@@ -0,0 +1,27 @@
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from .collectors import TEMPLATE_RENDER_TIME
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            TEMPLATE_RENDER_TIME.labels(
+                template=self.origin.template_name or "<string>"
+            ).observe(time.perf_counter() - start)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, recording render time per template."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,50 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+
+class MetricsViewTest(TestCase):
+    @override_settings(METRICS_TOKEN="secret")
+    def test_needs_the_token(self):
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        response = self.client.get(url, headers={"Authorization": "Bearer wrong"})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get(url, headers={"Authorization": "Bearer secret"})
+        self.assertContains(response, "django_http_requests")
+
+    @override_settings(METRICS_TOKEN="")
+    def test_refused_without_a_token(self):
+        response = self.client.get(
+            reverse("metrics"), headers={"Authorization": "Bearer "}
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class MetricsMiddlewareTest(TestCase):
+    def samples(self, view, status):
+        return [
+            REGISTRY.get_sample_value(name, labels) or 0
+            for name, labels in [
+                (
+                    "django_http_requests_total",
+                    {"view": view, "method": "GET", "status": status},
+                ),
+                (
+                    "django_http_request_duration_seconds_count",
+                    {"view": view, "method": "GET"},
+                ),
+                ("django_http_request_sql_queries_count", {"view": view}),
+            ]
+        ]
+
+    def test_records_requests(self):
+        before = self.samples("login", "200")
+        self.assertEqual(self.client.get(reverse("login")).status_code, 200)
+        self.assertEqual(self.samples("login", "200"), [count + 1 for count in before])
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_leaves_out_scrapes(self):
+        before = self.samples("metrics", "200")
+        self.client.get(reverse("metrics"), headers={"Authorization": "Bearer secret"})
+        self.assertEqual(self.samples("metrics", "200"), before)
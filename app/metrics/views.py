@@ -0,0 +1,34 @@
+import os
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+
+def has_metrics_token(request):
+    token = settings.METRICS_TOKEN
+    return bool(token) and constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    )
+
+
+def metrics_view(request):
+    # Not only nginx's deny rule: the app port can be reached without it.
+    if not has_metrics_token(request):
+        return HttpResponseForbidden()
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # Merge the samples every gunicorn worker of this container wrote
+        # to its directory, so any worker can answer for the service. Each
+        # service is its own scrape target (see docker-compose.yml).
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
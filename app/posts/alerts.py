@@ -0,0 +1,323 @@
+"""
+Live alerts for urgent and confidential incoming correspondence.
+
+Saving an urgent or confidential Incoming publishes a small JSON alert. On
+PostgreSQL it goes out with NOTIFY and one thread per process LISTENs for
+it. Other databases are polled by one task per process, which only queries
+the register when its version changed. Either way every alert is fanned out
+to the asyncio queues of that process's subscribers.
+
+The Server-Sent Events stream is served by AlertsApplication, mounted in
+cf.asgi in front of Django. Django's own handler keeps a thread for every
+request until its response is finished, which for a stream is until the
+client leaves. Here an idle client costs a queue on the event loop.
+"""
+
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from contextlib import aclosing
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connections, transaction
+from django.db.models import Q
+from django.http import HttpRequest
+from django.http.cookie import parse_cookie
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
+
+from . import versions
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "posts_incoming_alerts"
+
+
+def alert_payload(incoming):
+    return {
+        "id": incoming.pk,
+        "subject": incoming.subject,
+        "r_from": incoming.r_from,
+        "dated": incoming.dated,
+        "urgent": incoming.urgent,
+        "conf": incoming.conf,
+        "url": incoming.get_absolute_url(),
+        "created_at": incoming.created_at,
+        "updated_at": incoming.updated_at,
+        "created_by_id": incoming.created_by_id,
+    }
+
+
+def can_see(user, alert):
+    """Incoming.can_be_viewed_by, for an alert."""
+    if not alert["conf"]:
+        return True
+    return (
+        user.is_superuser
+        or user.is_manager
+        or user.is_admin
+        or alert["created_by_id"] == user.pk
+    )
+
+
+def notify(alert, using="default"):
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_notify(%s, %s)",
+            [CHANNEL, json.dumps(alert, cls=DjangoJSONEncoder)],
+        )
+
+
+def publish(sender, instance, **kwargs):
+    """post_save receiver: announce urgent and confidential letters."""
+    if not (instance.urgent or instance.conf):
+        return
+    using = kwargs.get("using") or "default"
+    if connections[using].vendor != "postgresql":
+        # The poller finds the change by itself.
+        return
+    alert = alert_payload(instance)
+    transaction.on_commit(lambda: notify(alert, using), using=using)
+
+
+def changed_since(since, limit=100):
+    """Alerts for urgent and confidential letters saved after ``since``."""
+    from .models import Incoming
+
+    incomings = Incoming.objects.filter(Q(urgent=True) | Q(conf=True)).order_by(
+        "updated_at", "id"
+    )
+    if since is not None:
+        incomings = incomings.filter(updated_at__gt=since)
+    return [alert_payload(incoming) for incoming in incomings[:limit]]
+
+
+def latest_change():
+    from .models import Incoming
+
+    return (
+        Incoming.objects.filter(Q(urgent=True) | Q(conf=True))
+        .order_by("-updated_at")
+        .values_list("updated_at", flat=True)
+        .first()
+    )
+
+
+def poll_once(state):
+    """One round of the polling fallback, run in a worker thread."""
+    close_old_connections()
+    (version,), _ = versions.current(versions.INCOMING)
+    if version == state.get("version"):
+        return []
+    state["version"] = version
+    if "since" not in state:
+        # Only what changes from now on.
+        state["since"] = latest_change()
+        return []
+    alerts = changed_since(state["since"])
+    if alerts:
+        state["since"] = alerts[-1]["updated_at"]
+    return alerts
+
+
+class Broker:
+    """Fans alerts out to the subscribers of this process."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.loop = None
+        self.poller = None
+        self.listener = None
+
+    def subscribe(self):
+        self.loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=settings.INCOMING_ALERTS_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.poller is not None:
+            self.poller.cancel()
+
+    def publish(self, alert):
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(alert)
+            except asyncio.QueueFull:
+                # A client this far behind reconnects and catches up with
+                # Last-Event-ID instead.
+                pass
+
+    def start(self):
+        """Start this process's change feed, once."""
+        if connections["default"].vendor == "postgresql":
+            if self.listener is None or not self.listener.is_alive():
+                self.listener = threading.Thread(
+                    target=self.listen, name="incoming-alerts", daemon=True
+                )
+                self.listener.start()
+        elif self.poller is None or self.poller.done():
+            self.poller = self.loop.create_task(self.poll())
+
+    async def poll(self):
+        state = {}
+        while self.subscribers:
+            try:
+                for alert in await sync_to_async(poll_once)(state):
+                    self.publish(alert)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Polling for incoming alerts failed.")
+            await asyncio.sleep(settings.INCOMING_ALERTS_POLL_INTERVAL)
+
+    def listen(self):
+        # psycopg2 delivers notifications on a connection in autocommit
+        # mode, which Django connections are outside atomic blocks.
+        while True:
+            connection = connections["default"]
+            try:
+                connection.ensure_connection()
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                raw = connection.connection
+                while True:
+                    if select.select([raw], [], [], 60) == ([], [], []):
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        payload = raw.notifies.pop(0).payload
+                        self.loop.call_soon_threadsafe(
+                            self.publish, json.loads(payload)
+                        )
+            except Exception:
+                logger.exception("Listening for incoming alerts failed.")
+                connection.close()
+                time.sleep(settings.INCOMING_ALERTS_POLL_INTERVAL)
+
+
+broker = Broker()
+
+
+def sse_event(alert):
+    public = {key: value for key, value in alert.items() if key != "created_by_id"}
+    data = json.dumps(public, cls=DjangoJSONEncoder)
+    # Clients send the last id back when they reconnect.
+    event_id = json.loads(data)["updated_at"]
+    return f"id: {event_id}\nevent: incoming\ndata: {data}\n\n"
+
+
+async def stream(user, last_event_id=None):
+    """The Server-Sent Events of ``user``, for as long as they stay connected."""
+    queue = broker.subscribe()
+    broker.start()
+    try:
+        yield f"retry: {settings.INCOMING_ALERTS_RETRY * 1000}\n\n"
+        since = parse_datetime(last_event_id or "")
+        if since is not None:
+            for alert in await sync_to_async(changed_since)(since):
+                if can_see(user, alert):
+                    yield sse_event(alert)
+        while True:
+            try:
+                alert = await asyncio.wait_for(
+                    queue.get(), settings.INCOMING_ALERTS_HEARTBEAT
+                )
+            except TimeoutError:
+                # Keeps proxies from closing an idle connection.
+                yield ": keep-alive\n\n"
+                continue
+            if can_see(user, alert):
+                yield sse_event(alert)
+    finally:
+        broker.unsubscribe(queue)
+
+
+def scope_user(scope):
+    """The user logged in on an ASGI request, as AuthenticationMiddleware sees it."""
+    headers = dict(scope["headers"])
+    request = HttpRequest()
+    request.COOKIES = parse_cookie(headers.get(b"cookie", b"").decode("latin-1"))
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    )
+    try:
+        return auth.get_user(request)
+    finally:
+        close_old_connections()
+
+
+class AlertsApplication:
+    """
+    ASGI application answering the incoming-alerts URL with the live stream
+    and passing every other request on to ``application``.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.path = None
+
+    async def __call__(self, scope, receive, send):
+        if self.path is None:
+            self.path = reverse("incoming-alerts")
+        if scope["type"] != "http" or scope["path"] != self.path:
+            return await self.application(scope, receive, send)
+        if scope["method"] not in ("GET", "HEAD"):
+            return await self.respond(send, 405)
+
+        # With Redis, sessions and users are cached and this rarely waits on
+        # the database. It never holds a thread past the lookup.
+        user = await sync_to_async(scope_user)(scope)
+        if not user.is_authenticated or not user.is_creator:
+            return await self.respond(send, 403)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream"),
+                    (b"cache-control", b"no-cache"),
+                    # Tell nginx to pass events on as they come.
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+        if scope["method"] == "HEAD":
+            return await send({"type": "http.response.body"})
+        last_event_id = dict(scope["headers"]).get(b"last-event-id", b"").decode()
+        events = asyncio.create_task(self.send_events(send, user, last_event_id))
+        disconnect = asyncio.create_task(self.wait_for_disconnect(receive))
+        await asyncio.wait([events, disconnect], return_when=asyncio.FIRST_COMPLETED)
+        for task in (events, disconnect):
+            task.cancel()
+        # Let the stream unsubscribe before the connection is gone.
+        await asyncio.gather(events, disconnect, return_exceptions=True)
+
+    async def respond(self, send, status):
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body"})
+
+    async def send_events(self, send, user, last_event_id):
+        async with aclosing(stream(user, last_event_id)) as events:
+            async for event in events:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": event.encode(),
+                        "more_body": True,
+                    }
+                )
+
+    async def wait_for_disconnect(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from users.models import User
+
+        from . import alerts, blobs, stats, versions
+        from .models import Incoming, Outgoing
+
+        blobs.connect(Incoming)
+        blobs.connect(Outgoing)
+        stats.connect(Incoming)
+        stats.connect(Outgoing)
+        post_save.connect(versions.bump_incoming, sender=Incoming)
+        post_save.connect(alerts.publish, sender=Incoming)
+        post_delete.connect(versions.bump_incoming, sender=Incoming)
+        # Authors' names and the viewer's roles show on the register pages.
+        versions.connect_users(User)
@@ -0,0 +1,172 @@
+"""
+Archival of old incoming correspondence.
+
+Records received before a cutoff are copied with their comments into
+ArchivedIncoming and deleted from the active register, so the list, the
+search and their indexes only cover recent letters. Documents are
+recompressed with xz under ARCHIVE_ROOT, keeping their content-addressed
+names, so a document shared by several letters is stored there once too.
+"""
+
+import lzma
+import os
+import tempfile
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import search, stats
+from .models import (
+    ArchivedIncoming,
+    ArchivedIncomingComment,
+    DocumentText,
+    Incoming,
+    IncomingComment,
+    Outgoing,
+)
+from .storage import READ_SIZE, is_blob
+
+ARCHIVE_EXTENSION = ".xz"
+
+INCOMING_FIELDS = [
+    "id",
+    "conf",
+    "urgent",
+    "uid",
+    "slug",
+    "created_at",
+    "updated_at",
+    "created_by_id",
+    "updated_by_id",
+    "received",
+    "r_from",
+    "note",
+    "sender",
+    "dated",
+    "subject",
+    "phone",
+    "phone1",
+    "email",
+    "search_vector",
+]
+COMMENT_FIELDS = [
+    "comment",
+    "created_at",
+    "updated_at",
+    "created_by_id",
+    "updated_by_id",
+    "comment_html",
+    "comment_html_version",
+]
+
+
+def archive_path(archive_name):
+    return os.path.join(settings.ARCHIVE_ROOT, archive_name)
+
+
+def compress_file(name):
+    """Write an xz copy of stored file ``name`` and return its archive name."""
+    if not name or not default_storage.exists(name):
+        return ""
+    archive_name = name + ARCHIVE_EXTENSION
+    path = archive_path(archive_name)
+    if is_blob(name) and os.path.exists(path):
+        # Same name, same content.
+        return archive_name
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temporary_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with (
+            os.fdopen(fd, "wb") as raw,
+            lzma.open(
+                raw, "wb", preset=settings.ARCHIVE_COMPRESSION_PRESET
+            ) as compressed,
+            default_storage.open(name, "rb") as source,
+        ):
+            for data in iter(lambda: source.read(READ_SIZE), b""):
+                compressed.write(data)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+    return archive_name
+
+
+def open_document(archived):
+    """The decompressed document of an ArchivedIncoming, as a file."""
+    return lzma.open(archive_path(archived.archive_file), "rb")
+
+
+def is_referenced(name):
+    return (
+        Incoming.objects.filter(file=name).exists()
+        or Outgoing.objects.filter(file=name).exists()
+    )
+
+
+def archive(incomings):
+    """
+    Move the records of ``incomings``, an Incoming queryset, and their
+    comments to the archive. Returns how many were archived.
+    """
+    # Compressed before the transaction: a failed batch leaves at most a
+    # compressed copy behind, which the next attempt reuses.
+    names = {name for name in incomings.values_list("file", flat=True) if name}
+    archive_names = {name: compress_file(name) for name in names}
+
+    with transaction.atomic():
+        # Read again under a lock, so edits made since are archived rather
+        # than lost. New comments wait for it too: the foreign key check on
+        # their insert conflicts with FOR UPDATE.
+        # Every field is copied, the search vector too.
+        incomings = list(incomings.select_for_update().defer(None))
+        if not incomings:
+            return 0
+        pks = [incoming.pk for incoming in incomings]
+        comments = list(
+            IncomingComment.objects.select_for_update().filter(incoming_id__in=pks)
+        )
+        names = {incoming.file.name for incoming in incomings if incoming.file}
+        for name in names - archive_names.keys():
+            # The document was replaced in the meantime.
+            archive_names[name] = compress_file(name)
+        texts = dict(
+            DocumentText.objects.filter(
+                blob__name__in=names, status=DocumentText.READY
+            ).values_list("blob__name", "text")
+        )
+
+        ArchivedIncoming.objects.bulk_create(
+            [
+                ArchivedIncoming(
+                    **{field: getattr(incoming, field) for field in INCOMING_FIELDS},
+                    file=incoming.file.name or "",
+                    archive_file=archive_names.get(incoming.file.name, ""),
+                    document_text=texts.get(incoming.file.name, ""),
+                )
+                for incoming in incomings
+            ]
+        )
+        ArchivedIncomingComment.objects.bulk_create(
+            [
+                ArchivedIncomingComment(
+                    incoming_id=comment.incoming_id,
+                    **{field: getattr(comment, field) for field in COMMENT_FIELDS},
+                )
+                for comment in comments
+            ]
+        )
+        search.remove_from_index(pks)
+        # The delete signals release the blobs, whose files go once nothing
+        # references them, and bump the register version (posts.versions).
+        Incoming.objects.filter(pk__in=pks).delete()
+        # They uncount the letters too, which still count in the register
+        # statistics once archived (see stats.ARCHIVES).
+        stats.count(incomings)
+        for name in names:
+            if archive_names[name] and not is_blob(name) and not is_referenced(name):
+                transaction.on_commit(partial(default_storage.delete, name))
+    return len(incomings)
@@ -0,0 +1,121 @@
+import datetime
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from . import previews
+from .storage import is_blob
+
+
+def acquire(name, count=1):
+    from .models import Blob
+
+    if not is_blob(name):
+        return
+    updated = Blob.objects.filter(name=name).update(ref_count=F("ref_count") + count)
+    if not updated:
+        blob, created = Blob.objects.get_or_create(
+            name=name,
+            defaults={"size": default_storage.size(name), "ref_count": count},
+        )
+        if created:
+            # New content: render previews and extract its text once the
+            # row is committed.
+            transaction.on_commit(lambda: queue_processing(name))
+        else:
+            Blob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") + count)
+
+
+def queue_processing(name):
+    from .tasks import extract_document_text, generate_previews
+
+    generate_previews.enqueue(name)
+    extract_document_text.enqueue(name)
+
+
+def release(name):
+    from .models import Blob
+
+    if not is_blob(name):
+        return
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(name=name).first()
+        if blob is None or not blob.ref_count:
+            return
+        Blob.objects.filter(pk=blob.pk).update(ref_count=F("ref_count") - 1)
+        if blob.ref_count == 1:
+            # The row stays, at zero references, until the file is deleted:
+            # storing the same content again and deleting it both lock it.
+            transaction.on_commit(lambda: queue_deletion(name))
+
+
+def queue_deletion(name, run_at=None):
+    from .tasks import delete_unreferenced_blob
+
+    delete_unreferenced_blob.enqueue(
+        name,
+        run_at=run_at
+        or timezone.now() + datetime.timedelta(seconds=settings.BLOB_DELETE_GRACE),
+    )
+
+
+def delete_if_unreferenced(name):
+    """
+    Delete blob ``name`` if nothing references it and the storage has not
+    handed its file to an upload for BLOB_DELETE_GRACE seconds. Such an
+    upload takes its reference right after saving the record. Returns when
+    to check again, or None.
+    """
+    from .models import Blob
+
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(name=name).first()
+        if blob is None or blob.ref_count:
+            return None
+        if default_storage.exists(name):
+            retry_at = default_storage.get_modified_time(name) + datetime.timedelta(
+                seconds=settings.BLOB_DELETE_GRACE
+            )
+            if retry_at > timezone.now():
+                return retry_at
+        blob.delete()
+        delete_file(name)
+    return None
+
+
+def delete_file(name):
+    default_storage.delete(name)
+    previews.delete_previews(name)
+
+
+def remember_file(sender, instance, **kwargs):
+    # A deferred file field is not loaded, and therefore not changed, by save().
+    value = instance.__dict__.get("file")
+    instance._stored_file_name = getattr(value, "name", value)
+
+
+def count_file_references(sender, instance, **kwargs):
+    if "file" not in instance.__dict__:
+        return
+    new_name = instance.file.name
+    old_name = getattr(instance, "_stored_file_name", None)
+    if new_name == old_name:
+        return
+    acquire(new_name)
+    if old_name:
+        release(old_name)
+    instance._stored_file_name = new_name
+
+
+def release_file_reference(sender, instance, **kwargs):
+    release(getattr(instance, "_stored_file_name", None) or instance.file.name)
+
+
+def connect(model):
+    post_init.connect(remember_file, sender=model)
+    post_save.connect(count_file_references, sender=model)
+    post_delete.connect(release_file_reference, sender=model)
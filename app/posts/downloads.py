@@ -0,0 +1,107 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import content_disposition_header, http_date
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Return the inclusive ``(start, end)`` byte positions asked for by a
+    single-range ``Range`` header, or None to send the whole file.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Malformed or multi-range requests get the full file (RFC 9110).
+        return None
+    first, last = match.groups()
+    if first == "":
+        if last == "":
+            return None
+        suffix = int(last)
+        if suffix == 0:
+            raise RangeNotSatisfiable
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size:
+        raise RangeNotSatisfiable
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def iter_file_range(file, start, length):
+    with file:
+        file.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = file.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+
+def accel_redirect_response(fieldfile, filename):
+    # nginx does the transfer (and Range handling) from its internal location,
+    # the worker only sends these headers.
+    response = HttpResponse()
+    response["X-Accel-Redirect"] = settings.PROTECTED_MEDIA_URL + quote(fieldfile.name)
+    response["Content-Type"] = (
+        mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    )
+    response["Content-Disposition"] = content_disposition_header(False, filename)
+    return response
+
+
+def range_file_response(request, fieldfile, filename):
+    path = fieldfile.path
+    size = os.path.getsize(path)
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    byte_range = None
+    if request.headers.get("Range"):
+        try:
+            byte_range = parse_range(request.headers["Range"], size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, "rb"), filename=filename)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            iter_file_range(open(path, "rb"), start, end - start + 1),
+            status=206,
+            content_type=content_type,
+        )
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Disposition"] = content_disposition_header(
+            False, filename
+        )
+    response["Accept-Ranges"] = "bytes"
+    response["Last-Modified"] = http_date(os.path.getmtime(path))
+    return response
+
+
+def serve_file(request, fieldfile, filename=None):
+    """Send a stored file to an already authorized user."""
+    filename = filename or os.path.basename(fieldfile.name)
+    if settings.PROTECTED_MEDIA_X_ACCEL:
+        return accel_redirect_response(fieldfile, filename)
+    return range_file_response(request, fieldfile, filename)
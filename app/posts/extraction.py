@@ -0,0 +1,108 @@
+"""
+Plain text extraction from stored documents.
+
+Nothing here touches the database or settings, so ``extract_file`` can run
+in a process pool (see the extract_documents command).
+"""
+
+import html
+import os
+import re
+import shutil
+import subprocess
+import zipfile
+
+from django.utils.html import strip_tags
+
+TEXT_EXTENSIONS = {".txt", ".csv", ".md", ".rtf"}
+HTML_EXTENSIONS = {".html", ".htm"}
+# Office Open XML and OpenDocument text: the body is one XML part of a zip.
+XML_DOCUMENT_PARTS = {".docx": "word/document.xml", ".odt": "content.xml"}
+
+XML_PARAGRAPH_END = re.compile(r"</(?:w:p|text:p|text:h)>")
+XML_TAG = re.compile(r"<[^>]+>")
+SPACES = re.compile(r"[ \t\r\f\v]+")
+BLANK_LINES = re.compile(r"\n\s*\n+")
+
+READ_SIZE = 64 * 1024
+# At most this many bytes are read per character kept: room for any UTF-8
+# character, and for the spaces normalize() collapses. Office XML is mostly
+# markup, so its body part gets more.
+BYTES_PER_CHARACTER = 4
+XML_BYTES_PER_CHARACTER = 32
+
+
+class ExtractionUnavailable(Exception):
+    """No local tool can read text out of this kind of document."""
+
+
+def decode(data):
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError as error:
+        if error.reason == "unexpected end of data":
+            # Read up to a limit in the middle of a character.
+            return decode(data[: error.start])
+        return data.decode("latin-1")
+
+
+def read_limited(file, limit):
+    """Read ``file`` in chunks, up to ``limit`` bytes."""
+    parts, length = [], 0
+    while length < limit and (data := file.read(min(READ_SIZE, limit - length))):
+        parts.append(data)
+        length += len(data)
+    return b"".join(parts)
+
+
+def normalize(text, max_length):
+    text = SPACES.sub(" ", text.replace("\x00", ""))
+    text = BLANK_LINES.sub("\n\n", text)
+    return text.strip()[:max_length]
+
+
+def read_pdf(path, timeout):
+    if not shutil.which("pdftotext"):
+        raise ExtractionUnavailable("pdftotext is not installed.")
+    result = subprocess.run(
+        ["pdftotext", "-enc", "UTF-8", "-q", path, "-"],
+        check=True,
+        capture_output=True,
+        timeout=timeout,
+    )
+    return decode(result.stdout)
+
+
+def read_xml_document(path, part, limit):
+    with zipfile.ZipFile(path) as archive:
+        # The part is streamed: a small archive can hold a huge part, and the
+        # declared size is only a hint until it has been read.
+        size = archive.getinfo(part).file_size
+        with archive.open(part) as file:
+            xml = decode(read_limited(file, min(size, limit)))
+    if xml.rfind("<") > xml.rfind(">"):
+        # Cut short inside a tag.
+        xml = xml[: xml.rfind("<")]
+    return html.unescape(XML_TAG.sub("", XML_PARAGRAPH_END.sub("\n", xml)))
+
+
+def read_text(path, extension, timeout, max_length):
+    if extension == ".pdf":
+        return read_pdf(path, timeout)
+    if extension in XML_DOCUMENT_PARTS:
+        return read_xml_document(
+            path, XML_DOCUMENT_PARTS[extension], max_length * XML_BYTES_PER_CHARACTER
+        )
+    if extension in TEXT_EXTENSIONS | HTML_EXTENSIONS:
+        with open(path, "rb") as file:
+            text = decode(read_limited(file, max_length * BYTES_PER_CHARACTER))
+        if extension in HTML_EXTENSIONS:
+            text = html.unescape(strip_tags(text))
+        return text
+    raise ExtractionUnavailable(f"Cannot read text from {extension or 'this file'}.")
+
+
+def extract_file(path, max_length, timeout):
+    """Return the normalized text of the document at ``path``."""
+    extension = os.path.splitext(path)[1].lower()
+    return normalize(read_text(path, extension, timeout, max_length), max_length)
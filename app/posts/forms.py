@@ -1,8 +1,11 @@
 from django import forms
 
-from .models import Incoming, IncomingComment
+from .models import ChunkedUpload, Incoming, IncomingComment, Outgoing
 
 class IncomingForm(forms.ModelForm):
+    # Set by the chunked uploader instead of posting the file itself.
+    upload_id = forms.UUIDField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Incoming
         fields = [
@@ -18,11 +21,52 @@ class IncomingForm(forms.ModelForm):
             "phone1",
             "file",
         ]
-        
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = user
+        self.upload = None
+        # Either a posted file or a finished chunked upload is required.
+        self.fields["file"].required = False
+
+    def clean(self):
+        cleaned_data = super().clean()
+        upload_id = cleaned_data.get("upload_id")
+        if upload_id:
+            self.upload = ChunkedUpload.objects.filter(
+                uid=upload_id, created_by=self.user, status=ChunkedUpload.COMPLETE
+            ).first()
+            if self.upload is None:
+                self.add_error("file", "The uploaded file could not be found.")
+        elif not cleaned_data.get("file"):
+            self.add_error("file", "This field is required.")
+        return cleaned_data
+
+    def save(self, commit=True):
+        if self.upload is not None:
+            self.upload.attach(self.instance.file)
+        return super().save(commit)
+
+
+class OutgoingForm(forms.ModelForm):
+    class Meta:
+        model = Outgoing
+        fields = [
+            "conf",
+            "urgent",
+            "add_to",
+            "sender",
+            "dated",
+            "subject",
+            "note",
+            "file",
+        ]
+
+
 class IncomingCommentForm(forms.ModelForm):
     class Meta:
         model = IncomingComment
         fields = ["comment"]
         widgets = {
-            "comments": forms.Textarea(attrs={"rows": 3, "cols": 30}),
+            "comment": forms.Textarea(attrs={"rows": 3, "cols": 30}),
         }
\ No newline at end of file
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from posts import archive
+from posts.models import Incoming
+
+
+class Command(BaseCommand):
+    help = (
+        "Move incoming correspondence received before a cutoff, with its "
+        "comments, to the archive and recompress its documents into "
+        "ARCHIVE_ROOT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            help="Archive records received before this date (YYYY-MM-DD).",
+        )
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=settings.ARCHIVE_AFTER_YEARS,
+            help="Archive records received more than this many years ago.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the records that would be archived.",
+        )
+
+    def get_cutoff(self, options):
+        if options["before"]:
+            try:
+                cutoff = parse_date(options["before"])
+            except ValueError:
+                cutoff = None
+            if cutoff is None:
+                raise CommandError("--before must be a date as YYYY-MM-DD.")
+            return cutoff
+        today = timezone.localdate()
+        try:
+            return today.replace(year=today.year - options["older_than"])
+        except ValueError:
+            # 29 February
+            return today.replace(year=today.year - options["older_than"], day=28)
+
+    def handle(self, *args, **options):
+        cutoff = self.get_cutoff(options)
+        incomings = Incoming.objects.filter(received__lt=cutoff).order_by("pk")
+        if options["dry_run"]:
+            self.stdout.write(
+                f"{incomings.count()} records received before {cutoff} to archive."
+            )
+            return
+
+        archived = 0
+        # Archived rows leave the table, so each batch is simply the first
+        # rows left.
+        while count := archive.archive(incomings[: options["batch_size"]]):
+            archived += count
+            self.stdout.write(f"{archived} archived")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {archived} records received before {cutoff}."
+            )
+        )
@@ -0,0 +1,169 @@
+import json
+import random
+import re
+import subprocess
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Incoming
+from users.models import User
+
+SCENARIOS = ["list", "search", "filter", "detail", "comment", "login"]
+
+SEARCH_TERMS = ["budget", "road works", "salary", "ministry", "drainage repair"]
+
+# Queries made to load the session and the logged in user, as opposed to
+# the ones the view makes (those join users_user from another table).
+AUTH_QUERY = re.compile(r'FROM "(django_session|users_user)"')
+
+
+def percentile(values, percent):
+    # Nearest-rank percentile on already sorted values.
+    index = max(int(round(percent / 100 * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the main views in-process through the test client against the "
+        "current database (see seed_correspondence) and print latency "
+        "percentiles and queries per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=100)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=SCENARIOS,
+            help="Run only these scenarios (repeatable). Default: all.",
+        )
+        parser.add_argument("--username", default="seed-user-0")
+        parser.add_argument("--password", default="password")
+        parser.add_argument("--output", help="Also write the JSON report here.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            self.user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(
+                f"User {options['username']} not found, run seed_correspondence first."
+            )
+        self.random = random.Random(options["seed"])
+        self.password = options["password"]
+        self.slugs = list(
+            Incoming.objects.order_by("?").values_list("slug", flat=True)[:500]
+        )
+        if not self.slugs:
+            raise CommandError("No incoming found, run seed_correspondence first.")
+
+        report = {
+            "commit": self.git_commit(),
+            "requests": options["requests"],
+            "rows": {"incoming": Incoming.objects.count()},
+            "scenarios": {},
+        }
+        allowed_hosts = [*settings.ALLOWED_HOSTS, "testserver"]
+        with override_settings(ALLOWED_HOSTS=allowed_hosts):
+            # Comments posted by the benchmark are rolled back.
+            with transaction.atomic():
+                for name in options["scenario"] or SCENARIOS:
+                    report["scenarios"][name] = self.run_scenario(
+                        name, options["requests"], options["warmup"]
+                    )
+                transaction.set_rollback(True)
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def run_scenario(self, name, requests, warmup):
+        client = Client()
+        if name != "login":
+            client.force_login(self.user)
+        make_request = getattr(self, f"request_{name}")
+
+        for _ in range(warmup):
+            make_request(client)
+
+        timings = []
+        queries = []
+        auth_queries = []
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = make_request(client)
+                timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                raise CommandError(f"{name}: HTTP {response.status_code}")
+            queries.append(len(context.captured_queries))
+            auth_queries.append(
+                sum(
+                    1
+                    for query in context.captured_queries
+                    if AUTH_QUERY.search(query["sql"])
+                )
+            )
+
+        timings.sort()
+        return {
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "p99_ms": round(percentile(timings, 99), 3),
+            "mean_ms": round(sum(timings) / len(timings), 3),
+            "queries_per_request": round(sum(queries) / len(queries), 2),
+            "max_queries": max(queries),
+            "auth_queries_per_request": round(sum(auth_queries) / len(auth_queries), 2),
+        }
+
+    def request_list(self, client):
+        return client.get(reverse("incoming-list"))
+
+    def request_search(self, client):
+        return client.get(
+            reverse("incoming-list"), {"q": self.random.choice(SEARCH_TERMS)}
+        )
+
+    def request_filter(self, client):
+        return client.get(
+            reverse("incoming-list"), {self.random.choice(["urgent", "conf"]): "1"}
+        )
+
+    def request_detail(self, client):
+        slug = self.random.choice(self.slugs)
+        return client.get(reverse("incoming-detail", kwargs={"slug": slug}))
+
+    def request_comment(self, client):
+        slug = self.random.choice(self.slugs)
+        return client.post(
+            reverse("incoming-add-comment", kwargs={"slug": slug}),
+            {"comment": "Benchmark comment with **markdown**."},
+        )
+
+    def request_login(self, client):
+        client.logout()
+        return client.post(
+            reverse("login"),
+            {"username": self.user.username, "password": self.password},
+        )
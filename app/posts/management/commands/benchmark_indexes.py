@@ -0,0 +1,130 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.utils import timezone
+
+from posts.models import Incoming
+from users.models import User
+
+BRIN_INDEXES = ["posts_inc_created_brin"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway Incoming dataset and print EXPLAIN plans and timings "
+        "of the list/filter queries with and without the list indexes. "
+        "Everything runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        with transaction.atomic(using=using):
+            self.seed(options["rows"], using)
+            self.analyze(using)
+
+            self.report("AFTER (with indexes)", options["repeat"], using)
+            self.drop_indexes(using)
+            self.analyze(using)
+            self.report("BEFORE (without indexes)", options["repeat"], using)
+
+            transaction.set_rollback(True, using=using)
+
+    def seed(self, rows, using):
+        self.stdout.write(f"Seeding {rows} incoming...")
+        user = User.objects.db_manager(using).create(
+            username="benchmark-indexes", email="benchmark-indexes@example.com"
+        )
+        start = datetime.date.today() - datetime.timedelta(days=365 * 10)
+        now = timezone.now()
+        batch = []
+        for i in range(rows):
+            dated = start + datetime.timedelta(days=random.randrange(365 * 10))
+            batch.append(
+                Incoming(
+                    slug=f"benchmark-{i}",
+                    urgent=random.random() < 0.05,
+                    conf=random.random() < 0.1,
+                    created_by=user,
+                    updated_by=user,
+                    received=dated,
+                    r_from=f"Ministry {i % 50}",
+                    dated=dated,
+                    subject=f"Benchmark letter {i}",
+                    file="incoming/benchmark.pdf",
+                )
+            )
+            if len(batch) == 5000:
+                Incoming.objects.using(using).bulk_create(batch)
+                batch = []
+        Incoming.objects.using(using).bulk_create(batch)
+        # auto_now_add ignores explicit values, spread created_at over time
+        # so the BRIN index has something to prune.
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Incoming._meta.db_table} SET created_at = %s",
+                [now - datetime.timedelta(days=365 * 10)],
+            )
+        for days, ids in enumerate(
+            self.chunks(
+                list(Incoming.objects.using(using).order_by("pk").values_list("pk", flat=True)),
+                max(rows // 3650, 1),
+            )
+        ):
+            Incoming.objects.using(using).filter(pk__in=ids).update(
+                created_at=now - datetime.timedelta(days=3650 - days)
+            )
+
+    def chunks(self, items, size):
+        for i in range(0, len(items), size):
+            yield items[i : i + size]
+
+    def analyze(self, using):
+        with connections[using].cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def drop_indexes(self, using):
+        names = [index.name for index in Incoming._meta.indexes]
+        if connections[using].vendor == "postgresql":
+            names += BRIN_INDEXES
+        with connections[using].cursor() as cursor:
+            for name in names:
+                cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def queries(self, using):
+        incoming = Incoming.objects.using(using)
+        middle = incoming.order_by("-dated", "-id")[incoming.count() // 2]
+        week_ago = timezone.now() - datetime.timedelta(days=7)
+        return {
+            "list first page": incoming.order_by("-dated", "-id")[:25],
+            "list deep page (cursor)": incoming.filter(dated__lte=middle.dated)
+            .exclude(dated=middle.dated, id__gte=middle.id)
+            .order_by("-dated", "-id")[:25],
+            "urgent filter": incoming.filter(urgent=True).order_by("-dated", "-id")[:25],
+            "confidential filter": incoming.filter(conf=True).order_by("-dated", "-id")[:25],
+            "created in last week": incoming.filter(created_at__gte=week_ago).order_by()[:25],
+        }
+
+    def report(self, title, repeat, using):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {title} =="))
+        for name, queryset in self.queries(using).items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"\n{name}: median {timings[len(timings) // 2]:.2f} ms, "
+                    f"max {timings[-1]:.2f} ms"
+                )
+            )
+            self.stdout.write(queryset.explain())
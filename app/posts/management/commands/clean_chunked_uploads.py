@@ -0,0 +1,21 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.models import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = "Delete chunked uploads (and their part files) abandoned for too long."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=48)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(hours=options["hours"])
+        count = 0
+        for upload in ChunkedUpload.objects.filter(updated_at__lt=cutoff).iterator():
+            upload.delete()
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Deleted {count} chunked uploads."))
@@ -0,0 +1,62 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts import extraction
+from posts.models import Blob, DocumentText
+from posts.tasks import extraction_args, store_document_text
+
+
+def extract(args):
+    # Runs in a pool process: return the outcome instead of raising so one
+    # bad document does not stop the backfill.
+    try:
+        return DocumentText.READY, extraction.extract_file(*args), ""
+    except extraction.ExtractionUnavailable as error:
+        return DocumentText.UNAVAILABLE, "", str(error)
+    except Exception as error:
+        return DocumentText.FAILED, "", repr(error)
+
+
+class Command(BaseCommand):
+    help = (
+        "Extract text for search from every document that has none yet, "
+        "using a bounded pool of processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=2)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--retry",
+            action="store_true",
+            help="Also retry failed and unavailable documents.",
+        )
+
+    def handle(self, *args, **options):
+        pending = Q(text__isnull=True) | Q(text__status=DocumentText.FAILED)
+        if options["retry"]:
+            pending |= Q(text__status=DocumentText.UNAVAILABLE)
+        blobs = Blob.objects.filter(pending).order_by("pk")
+
+        counts = dict.fromkeys([status for status, _ in DocumentText.STATUS_CHOICES], 0)
+        with ProcessPoolExecutor(max_workers=options["processes"]) as executor:
+            # Submit one batch at a time so the queue of pending work, and the
+            # memory it holds, stays bounded however many documents there are.
+            last_pk = 0
+            while batch := list(
+                blobs.filter(pk__gt=last_pk)[: options["batch_size"]]
+            ):
+                last_pk = batch[-1].pk
+                outcomes = executor.map(
+                    extract, [extraction_args(blob) for blob in batch]
+                )
+                for blob, (status, text, error) in zip(batch, outcomes):
+                    store_document_text(blob, status, text, error)
+                    counts[status] += 1
+                self.stdout.write(
+                    ", ".join(f"{count} {status}" for status, count in counts.items())
+                )
+
+        self.stdout.write(self.style.SUCCESS("Text extraction complete."))
@@ -0,0 +1,236 @@
+import csv
+import json
+import os
+import uuid
+from itertools import islice
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import slugify
+
+from posts import blobs, search, stats, versions
+from posts.forms import IncomingForm, OutgoingForm
+from posts.models import Incoming, Outgoing
+from posts.storage import file_sha256
+from users.models import User
+
+# Stable namespace so a row always gets the same uid/slug, which makes
+# re-running a batch after a crash a no-op instead of a duplicate. Rows are
+# keyed on the SHA-256 of their file and their line: files that only share
+# a name are different imports.
+IMPORT_NAMESPACE = uuid.UUID("6f1c1e64-3f4c-4a8e-9a53-0c9e4b1d2a77")
+
+FALSE_VALUES = {"", "0", "false", "no", "n", "off"}
+
+KINDS = {
+    "incoming": (Incoming, IncomingForm),
+    "outgoing": (Outgoing, OutgoingForm),
+}
+
+
+def read_rows(path, file_format):
+    """Yield ``(line_number, row)`` lazily from a CSV or JSONL file."""
+    with open(path, newline="", encoding="utf-8-sig") as file:
+        if file_format == "csv":
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(file, start=1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream historical Incoming/Outgoing records from CSV or JSONL into "
+        "the database in batches. Column names match the form fields, "
+        "'file' is a path relative to --files-dir. Resumable with --checkpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--kind", choices=KINDS, default="incoming")
+        parser.add_argument("--format", choices=["csv", "jsonl"])
+        parser.add_argument(
+            "--user", required=True, help="Username recorded as creator."
+        )
+        parser.add_argument(
+            "--files-dir", help="Directory the 'file' column is relative to."
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            help="Records the last imported line, defaults to <path>.checkpoint.",
+        )
+        parser.add_argument("--errors", help="Write rejected rows as JSONL here.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or (
+            "jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv"
+        )
+        self.model, self.form_class = KINDS[options["kind"]]
+        self.files_dir = options["files_dir"]
+        self.source = file_sha256(path)
+        try:
+            self.user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist.")
+        self.senders = {}
+
+        checkpoint_path = options["checkpoint"] or f"{path}.checkpoint"
+        resume_after = self.read_checkpoint(checkpoint_path)
+        if resume_after:
+            self.stdout.write(f"Resuming after line {resume_after}.")
+
+        errors_file = open(options["errors"], "a") if options["errors"] else None
+        imported = rejected = 0
+        rows = (
+            (line_number, row)
+            for line_number, row in read_rows(path, file_format)
+            if line_number > resume_after
+        )
+        try:
+            while True:
+                chunk = list(islice(rows, options["batch_size"]))
+                if not chunk:
+                    break
+                batch = []
+                for line_number, row in chunk:
+                    obj, error = self.build(line_number, row)
+                    if obj is None:
+                        rejected += 1
+                        self.report_error(errors_file, line_number, row, error)
+                    else:
+                        batch.append(obj)
+                imported += self.insert(batch)
+                self.write_checkpoint(checkpoint_path, chunk[-1][0])
+                self.stdout.write(
+                    f"Line {chunk[-1][0]}: {imported} imported, {rejected} rejected."
+                )
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(
+            self.style.SUCCESS(f"Done: {imported} imported, {rejected} rejected.")
+        )
+
+    def read_checkpoint(self, checkpoint_path):
+        if not os.path.exists(checkpoint_path):
+            return 0
+        with open(checkpoint_path) as file:
+            checkpoint = json.load(file)
+        if checkpoint.get("source") != self.source:
+            raise CommandError(
+                f"{checkpoint_path} belongs to another import, or the file "
+                "changed since."
+            )
+        return checkpoint["line"]
+
+    def write_checkpoint(self, checkpoint_path, line_number):
+        temporary = f"{checkpoint_path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump({"source": self.source, "line": line_number}, file)
+        os.replace(temporary, checkpoint_path)
+
+    def report_error(self, errors_file, line_number, row, error):
+        self.stderr.write(f"Line {line_number}: {error}")
+        if errors_file:
+            errors_file.write(
+                json.dumps({"line": line_number, "row": row, "error": error}) + "\n"
+            )
+
+    def build(self, line_number, row):
+        """Validate ``row`` with the model's form and return an unsaved object."""
+        data = {key: (value or "").strip() for key, value in row.items() if key}
+        for field in ("conf", "urgent"):
+            data[field] = data.get(field, "").lower() not in FALSE_VALUES
+        file_name = data.pop("file", "")
+
+        # Files and senders are resolved here, without a query per row.
+        ignored = {"file"}
+        sender = None
+        if self.model is Outgoing:
+            ignored.add("sender")
+            sender = self.get_sender(data.pop("sender", ""))
+            if sender is None:
+                return None, "Unknown sender."
+
+        if self.model is Incoming:
+            form = self.form_class(data=data, user=self.user)
+        else:
+            form = self.form_class(data=data)
+        form.is_valid()
+        errors = {
+            field: messages
+            for field, messages in form.errors.items()
+            if field not in ignored
+        }
+        if errors:
+            return None, "; ".join(
+                f"{field}: {' '.join(messages)}" for field, messages in errors.items()
+            )
+
+        file_path = None
+        if file_name:
+            file_path = os.path.join(self.files_dir or "", file_name)
+            if not os.path.isfile(file_path):
+                return None, f"file: {file_path} not found."
+
+        obj = form.instance
+        obj.uid = uuid.uuid5(IMPORT_NAMESPACE, f"{self.source}:{line_number}")
+        obj.slug = slugify(obj.uid)
+        obj.created_by = self.user
+        obj.updated_by = self.user
+        if sender is not None:
+            obj.sender = sender
+        obj._import_file_path = file_path
+        return obj, None
+
+    def get_sender(self, username):
+        if username not in self.senders:
+            self.senders[username] = User.objects.filter(
+                username=username.lower()
+            ).first()
+        return self.senders[username]
+
+    def insert(self, batch):
+        # Rows already imported by an interrupted run are skipped.
+        existing = set(
+            self.model.objects.filter(
+                slug__in=[obj.slug for obj in batch]
+            ).values_list("slug", flat=True)
+        )
+        batch = [obj for obj in batch if obj.slug not in existing]
+        if not batch:
+            return 0
+
+        for obj in batch:
+            if obj._import_file_path:
+                with open(obj._import_file_path, "rb") as file:
+                    obj.file.name = default_storage.save(
+                        os.path.basename(obj._import_file_path), File(file)
+                    )
+
+        with transaction.atomic():
+            self.model.objects.bulk_create(batch)
+            references = {}
+            for obj in batch:
+                if obj.file.name:
+                    references[obj.file.name] = references.get(obj.file.name, 0) + 1
+            for name, count in references.items():
+                blobs.acquire(name, count=count)
+            stats.count(batch)
+            if self.model is Incoming:
+                search.index_incomings(
+                    Incoming.objects.filter(slug__in=[obj.slug for obj in batch])
+                )
+                # bulk_create sends no post_save.
+                versions.bump(versions.INCOMING)
+        return len(batch)
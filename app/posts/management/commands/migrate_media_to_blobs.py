@@ -0,0 +1,74 @@
+import os
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import blobs
+from posts.models import Incoming, Outgoing
+from posts.storage import blob_name, file_sha256, is_blob
+
+MODELS = [Incoming, Outgoing]
+
+
+class Command(BaseCommand):
+    help = (
+        "Move documents stored under the old upload_to directories into the "
+        "content-addressed blobs/ab/cd/<sha256> layout, merging duplicates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        names = set()
+        for model in MODELS:
+            names.update(
+                model.objects.exclude(file="")
+                .exclude(file__startswith="blobs/")
+                .values_list("file", flat=True)
+                .distinct()
+            )
+
+        moved = merged = missing = 0
+        for name in sorted(names):
+            if is_blob(name):
+                continue
+            path = default_storage.path(name)
+            if not os.path.exists(path):
+                self.stderr.write(f"Missing file, skipped: {name}")
+                missing += 1
+                continue
+
+            # One streaming read per file, never loaded into memory.
+            target = blob_name(file_sha256(path), name)
+            target_path = default_storage.path(target)
+            duplicate = os.path.exists(target_path)
+            self.stdout.write(
+                f"{name} -> {target}{' (duplicate)' if duplicate else ''}"
+            )
+            if dry_run:
+                continue
+
+            if not duplicate:
+                os.makedirs(os.path.dirname(target_path), exist_ok=True)
+                file_move_safe(path, target_path)
+            with transaction.atomic():
+                references = sum(
+                    model.objects.filter(file=name).update(file=target)
+                    for model in MODELS
+                )
+                blobs.acquire(target, count=references)
+            if duplicate:
+                os.remove(path)
+                merged += 1
+            else:
+                moved += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Moved {moved} files, merged {merged} duplicates, {missing} missing."
+            )
+        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Blob
+from posts.tasks import generate_previews
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue preview rendering for documents that have none yet, e.g. blobs "
+        "stored before previews existed or after installing a renderer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--retry",
+            action="store_true",
+            help="Also queue failed and unavailable previews.",
+        )
+
+    def handle(self, *args, **options):
+        statuses = [Blob.PREVIEW_PENDING]
+        if options["retry"]:
+            statuses += [Blob.PREVIEW_FAILED, Blob.PREVIEW_UNAVAILABLE]
+        names = Blob.objects.filter(preview_status__in=statuses).values_list(
+            "name", flat=True
+        )
+        count = 0
+        for name in names.iterator():
+            generate_previews.enqueue(name)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Queued previews for {count} documents."))
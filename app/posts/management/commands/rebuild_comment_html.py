@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from posts.models import IncomingComment, OutgoingComment
+from posts.rendering import MARKDOWN_RENDERER_VERSION, render_markdown
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-render the stored Markdown HTML of comments written by an older "
+        "renderer version (or all of them with --all)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--all", action="store_true", help="Re-render every comment."
+        )
+
+    def handle(self, *args, **options):
+        for model in (IncomingComment, OutgoingComment):
+            total = self.rebuild(model, options["batch_size"], options["all"])
+            self.stdout.write(
+                self.style.SUCCESS(f"{model.__name__}: re-rendered {total} comments.")
+            )
+
+    def rebuild(self, model, batch_size, rebuild_all):
+        queryset = model.objects.only("pk", "comment").order_by("pk")
+        if not rebuild_all:
+            queryset = queryset.filter(
+                ~Q(comment_html_version=MARKDOWN_RENDERER_VERSION)
+                | Q(comment_html__isnull=True)
+            )
+
+        last_pk = 0
+        total = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                return total
+            for comment in batch:
+                comment.comment_html = render_markdown(comment.comment)
+                comment.comment_html_version = MARKDOWN_RENDERER_VERSION
+            # bulk_update leaves updated_at alone, this is not a user edit.
+            model.objects.bulk_update(
+                batch, ["comment_html", "comment_html_version"]
+            )
+            last_pk = batch[-1].pk
+            total += len(batch)
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats
+from posts.models import ArchivedIncoming, Incoming, Outgoing, RegisterStat
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount the register dashboard statistics from scratch, e.g. after "
+        "rows were changed with queryset.update() or raw SQL."
+    )
+
+    def handle(self, *args, **options):
+        stats.rebuild([Incoming, ArchivedIncoming, Outgoing], RegisterStat)
+        for register in stats.REGISTERS:
+            count = RegisterStat.objects.filter(register=register).count()
+            self.stdout.write(f"{register}: {count} buckets")
+        self.stdout.write(self.style.SUCCESS("Register statistics rebuilt."))
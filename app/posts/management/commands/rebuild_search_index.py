@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.models import Incoming
+
+
+class Command(BaseCommand):
+    help = "Rebuild the Incoming full-text search index in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--database", default="default")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        using = options["database"]
+        manager = Incoming.objects.using(using)
+
+        search.clear_index(using)
+
+        # Walk the table by primary key so every batch is an index range scan.
+        last_pk = 0
+        total = 0
+        while True:
+            pks = list(
+                manager.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            search.index_incomings(
+                manager.filter(pk__gte=pks[0], pk__lte=pks[-1])
+            )
+            last_pk = pks[-1]
+            total += len(pks)
+            self.stdout.write(f"Indexed {total} incoming")
+
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt ({total} rows)."))
@@ -0,0 +1,261 @@
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils.text import slugify
+
+from posts import blobs, search, stats, versions
+from posts.models import Incoming, IncomingComment, Outgoing, OutgoingComment
+from posts.rendering import MARKDOWN_RENDERER_VERSION, render_markdown
+from users.models import Department, User
+
+WORDS = (
+    "ministry department road works budget salary deduction infrastructure "
+    "request approval tender contract meeting minutes report quarterly annual "
+    "project drainage bridge repair invoice payment procurement review audit "
+    "circular memo staff training leave transfer appointment housing water "
+    "electricity survey land planning permit application complaint response "
+    "urgent follow up committee proposal estimate maintenance vehicle fleet "
+    "equipment office supplies policy notice public hearing community"
+).split()
+
+SENDERS = [
+    "Ministry of Finance",
+    "Ministry of Education",
+    "Ministry of Health",
+    "Office of the Prime Minister",
+    "Department of Public Service",
+    "Water and Sewerage Company",
+    "St. Lucia Electricity Services",
+    "Attorney General's Chambers",
+    "Castries Constituency Council",
+    "Ministry of Agriculture",
+]
+
+DEPARTMENTS = [
+    "Infrastructure",
+    "Ports",
+    "Transport",
+    "Physical Planning",
+    "Public Utilities",
+    "Administration",
+    "Finance",
+    "Human Resources",
+]
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-create users, departments, incoming/outgoing correspondence and "
+        "comments with realistic size distributions, for load testing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--incoming", type=int, default=10000)
+        parser.add_argument("--outgoing", type=int, default=2000)
+        parser.add_argument(
+            "--comments", type=float, default=3.0, help="Mean comments per letter."
+        )
+        parser.add_argument(
+            "--files",
+            type=int,
+            default=50,
+            help="Distinct dummy documents shared between the letters.",
+        )
+        parser.add_argument("--password", default="password")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        departments = self.seed_departments()
+        users = self.seed_users(options["users"], departments, options["password"])
+        files = self.seed_files(options["files"])
+        self.seed_incoming(options["incoming"], users, files, options["comments"])
+        self.seed_outgoing(options["outgoing"], users, files, options["comments"])
+        self.stdout.write(self.style.SUCCESS("Seeding complete."))
+
+    # Text and size generators
+
+    def words(self, low, high):
+        return " ".join(self.random.choices(WORDS, k=self.random.randint(low, high)))
+
+    def paragraph(self, mean_words):
+        # Long-tailed: most notes are short, a few are very long.
+        count = int(self.random.lognormvariate(0, 1) * mean_words)
+        return " ".join(self.random.choices(WORDS, k=max(count, 1))).capitalize() + "."
+
+    def date(self):
+        return datetime.date.today() - datetime.timedelta(
+            days=int(self.random.expovariate(1 / 700))
+        )
+
+    def comment_count(self, mean):
+        return min(int(self.random.expovariate(1 / mean)) if mean else 0, 200)
+
+    # Seeders
+
+    def seed_departments(self):
+        departments = []
+        for name in DEPARTMENTS:
+            department, _ = Department.objects.get_or_create(
+                slug=slugify(name), defaults={"name": name}
+            )
+            departments.append(department)
+        return departments
+
+    def seed_users(self, count, departments, password):
+        # Hashing once keeps seeding fast, every seeded user shares it.
+        hashed = make_password(password)
+        start = User.objects.filter(username__startswith="seed-user-").count()
+        users = [
+            User(
+                username=f"seed-user-{i}",
+                email=f"seed-user-{i}@example.com",
+                slug=f"seed-user-{i}",
+                password=hashed,
+                first_name=self.random.choice(WORDS).capitalize(),
+                last_name=self.random.choice(WORDS).capitalize(),
+                department=self.random.choice(departments),
+                is_creator=True,
+                # The first seeded user can see everything.
+                is_manager=i == 0,
+            )
+            for i in range(start, count)
+        ]
+        User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        self.stdout.write(f"Created {len(users)} users.")
+        return list(User.objects.filter(username__startswith="seed-user-"))
+
+    def seed_files(self, count):
+        names = []
+        for i in range(count):
+            # Scanned letters: median around 300 KB with a long tail.
+            size = int(min(self.random.lognormvariate(12.6, 1.0), 50 * 1024 * 1024))
+            content = b"%PDF-1.4\n%seed " + str(i).encode() + b"\n"
+            content += self.random.randbytes(max(size - len(content), 0))
+            names.append(
+                default_storage.save(f"seed-{i}.pdf", ContentFile(content))
+            )
+        self.stdout.write(f"Created {count} dummy documents.")
+        return names
+
+    def seed_incoming(self, count, users, files, mean_comments):
+        created = 0
+        while created < count:
+            size = min(BATCH_SIZE, count - created)
+            batch = []
+            for _ in range(size):
+                author = self.random.choice(users)
+                dated = self.date()
+                incoming = Incoming(
+                    conf=self.random.random() < 0.1,
+                    urgent=self.random.random() < 0.05,
+                    created_by=author,
+                    updated_by=author,
+                    received=dated
+                    + datetime.timedelta(days=self.random.randint(0, 10)),
+                    r_from=self.random.choice(SENDERS),
+                    note=self.paragraph(25) if self.random.random() < 0.7 else None,
+                    sender=self.words(2, 3).title(),
+                    dated=dated,
+                    subject=self.words(3, 12).capitalize(),
+                    phone=f"758{self.random.randint(1000000, 9999999)}",
+                    file=self.random.choice(files) if files else "",
+                )
+                # bulk_create skips save(), which is what fills the slug.
+                incoming.slug = slugify(incoming.uid)
+                batch.append(incoming)
+            Incoming.objects.bulk_create(batch)
+            self.count_references(batch)
+            stats.count(batch)
+            search.index_incomings(
+                Incoming.objects.filter(slug__in=[incoming.slug for incoming in batch])
+            )
+            versions.bump(versions.INCOMING)
+            incoming_by_slug = dict(
+                Incoming.objects.filter(
+                    slug__in=[incoming.slug for incoming in batch]
+                ).values_list("slug", "pk")
+            )
+            self.seed_comments(
+                IncomingComment,
+                "incoming_id",
+                [incoming_by_slug[incoming.slug] for incoming in batch],
+                users,
+                mean_comments,
+            )
+            created += size
+            self.stdout.write(f"Created {created}/{count} incoming.")
+
+    def seed_outgoing(self, count, users, files, mean_comments):
+        created = 0
+        while created < count:
+            size = min(BATCH_SIZE, count - created)
+            batch = []
+            for _ in range(size):
+                author = self.random.choice(users)
+                outgoing = Outgoing(
+                    created_by=author,
+                    updated_by=author,
+                    add_to=self.random.choice(SENDERS),
+                    conf=self.random.random() < 0.1,
+                    urgent=self.random.random() < 0.05,
+                    note=self.paragraph(25) if self.random.random() < 0.5 else None,
+                    sender=author,
+                    dated=self.date(),
+                    subject=self.words(3, 12).capitalize(),
+                    file=self.random.choice(files) if files else "",
+                )
+                outgoing.slug = slugify(outgoing.uid)
+                batch.append(outgoing)
+            Outgoing.objects.bulk_create(batch)
+            self.count_references(batch)
+            stats.count(batch)
+            outgoing_by_slug = dict(
+                Outgoing.objects.filter(
+                    slug__in=[outgoing.slug for outgoing in batch]
+                ).values_list("slug", "pk")
+            )
+            self.seed_comments(
+                OutgoingComment,
+                "outgoing_id",
+                [outgoing_by_slug[outgoing.slug] for outgoing in batch],
+                users,
+                mean_comments,
+            )
+            created += size
+            self.stdout.write(f"Created {created}/{count} outgoing.")
+
+    def count_references(self, batch):
+        references = {}
+        for obj in batch:
+            if obj.file.name:
+                references[obj.file.name] = references.get(obj.file.name, 0) + 1
+        for name, count in references.items():
+            blobs.acquire(name, count=count)
+
+    def seed_comments(self, model, parent_field, parent_ids, users, mean):
+        comments = []
+        for parent_id in parent_ids:
+            for _ in range(self.comment_count(mean)):
+                author = self.random.choice(users)
+                text = self.paragraph(15)
+                if self.random.random() < 0.2:
+                    text = f"**{self.words(1, 3)}**\n\n{text}"
+                comments.append(
+                    model(
+                        **{parent_field: parent_id},
+                        comment=text,
+                        comment_html=render_markdown(text),
+                        comment_html_version=MARKDOWN_RENDERER_VERSION,
+                        created_by=author,
+                        updated_by=author,
+                    )
+                )
+        model.objects.bulk_create(comments, batch_size=BATCH_SIZE)
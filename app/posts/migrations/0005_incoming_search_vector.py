@@ -0,0 +1,41 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS posts_incoming_search_vector_gin "
+            "ON posts_incoming USING gin (search_vector)"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS posts_incoming_fts "
+            "USING fts5(subject, r_from, sender, note, phone, phone1, "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        schema_editor.execute("DROP INDEX IF EXISTS posts_incoming_search_vector_gin")
+    elif vendor == "sqlite":
+        schema_editor.execute("DROP TABLE IF EXISTS posts_incoming_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_alter_incoming_sender'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incoming',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:15
+
+from django.db import migrations, models
+
+
+def create_brin_indexes(apps, schema_editor):
+    # BRIN only exists on Postgres; created_at is append-only so a block
+    # range index stays tiny and still prunes date range scans.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS posts_inc_created_brin "
+        "ON posts_incoming USING brin (created_at)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS posts_out_created_brin "
+        "ON posts_outgoing USING brin (created_at)"
+    )
+
+
+def drop_brin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS posts_inc_created_brin")
+    schema_editor.execute("DROP INDEX IF EXISTS posts_out_created_brin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_incoming_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='incoming',
+            index=models.Index(fields=['-dated', '-id'], name='posts_inc_dated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incoming',
+            index=models.Index(condition=models.Q(('urgent', True)), fields=['-dated', '-id'], name='posts_inc_urgent_dated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incoming',
+            index=models.Index(condition=models.Q(('conf', True)), fields=['-dated', '-id'], name='posts_inc_conf_dated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outgoing',
+            index=models.Index(fields=['-dated', '-id'], name='posts_out_dated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outgoing',
+            index=models.Index(condition=models.Q(('urgent', True)), fields=['-dated', '-id'], name='posts_out_urgent_dated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='outgoing',
+            index=models.Index(condition=models.Q(('conf', True)), fields=['-dated', '-id'], name='posts_out_conf_dated_idx'),
+        ),
+        migrations.RunPython(create_brin_indexes, drop_brin_indexes),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='incomingcomment',
+            name='comment_html',
+            field=models.TextField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='incomingcomment',
+            name='comment_html_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='outgoingcomment',
+            name='comment_html',
+            field=models.TextField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='outgoingcomment',
+            name='comment_html_version',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:26
+
+import django.db.models.deletion
+import posts.search
+from django.db import migrations, models
+
+
+def configure_rank(apps, schema_editor):
+    # Default rank for the FTS5 table, weighting subject above senders above
+    # notes and phone numbers, same as the Postgres setweight() order.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "INSERT INTO posts_incoming_fts(posts_incoming_fts, rank) "
+        "VALUES ('rank', 'bm25(10.0, 4.0, 4.0, 2.0, 1.0, 1.0)')"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IncomingSearchEntry',
+            fields=[
+                ('incoming', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='posts.incoming')),
+                ('match', posts.search.FtsMatchField(db_column='posts_incoming_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'posts_incoming_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(configure_rank, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_incomingsearchentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blob',
+            name='preview_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('unavailable', 'Unavailable'), ('failed', 'Failed')], default='pending', max_length=11),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+FTS_COLUMNS = ["subject", "r_from", "sender", "note", "phone", "phone1"]
+
+
+def rebuild_fts_table(schema_editor, columns, rank):
+    # FTS5 tables cannot gain columns, recreate it and copy the records back
+    # in. Extracted text is filled in by the extraction jobs.
+    schema_editor.execute("DROP TABLE IF EXISTS posts_incoming_fts")
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE posts_incoming_fts USING fts5({', '.join(columns)}, "
+        "tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO posts_incoming_fts(posts_incoming_fts, rank) "
+        f"VALUES ('rank', '{rank}')"
+    )
+    values = ", ".join(f"coalesce({column}, '')" for column in FTS_COLUMNS)
+    schema_editor.execute(
+        f"INSERT INTO posts_incoming_fts (rowid, {', '.join(FTS_COLUMNS)}) "
+        f"SELECT id, {values} FROM posts_incoming"
+    )
+
+
+def add_document_column(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    rebuild_fts_table(
+        schema_editor,
+        [*FTS_COLUMNS, "document"],
+        "bm25(10.0, 4.0, 4.0, 2.0, 1.0, 1.0, 1.0)",
+    )
+
+
+def remove_document_column(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    rebuild_fts_table(
+        schema_editor, FTS_COLUMNS, "bm25(10.0, 4.0, 4.0, 2.0, 1.0, 1.0)"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_blob_preview_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentText',
+            fields=[
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text', serialize=False, to='posts.blob')),
+                ('sha256', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('ready', 'Ready'), ('unavailable', 'Unavailable'), ('failed', 'Failed')], max_length=11)),
+                ('text', models.TextField(blank=True)),
+                ('error', models.TextField(blank=True)),
+                ('extracted_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(add_document_column, remove_document_column),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:39
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_documenttext'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegisterVersion',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:43
+
+from django.db import migrations, models
+
+
+def count_registers(apps, schema_editor):
+    from posts import stats
+
+    stats.rebuild(
+        [apps.get_model("posts", "Incoming"), apps.get_model("posts", "Outgoing")],
+        apps.get_model("posts", "RegisterStat"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_registerversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegisterStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('register', models.CharField(max_length=20)),
+                ('dimension', models.CharField(max_length=20)),
+                ('key', models.CharField(blank=True, max_length=255)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['register', 'dimension', '-count'], name='posts_registerstat_count_idx')],
+                'constraints': [models.UniqueConstraint(fields=('register', 'dimension', 'key'), name='posts_registerstat_bucket_unique')],
+            },
+        ),
+        migrations.RunPython(count_registers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.5 on 2026-10-18 15:50
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    # Archive searches are rare and explicit: PostgreSQL gets an index on
+    # the copied search vector, SQLite scans.
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS posts_archivedincoming_search_vector_gin "
+            "ON posts_archivedincoming USING gin (search_vector)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            "DROP INDEX IF EXISTS posts_archivedincoming_search_vector_gin"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_registerstat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedIncoming',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('conf', models.BooleanField(default=False, verbose_name='is confidential')),
+                ('urgent', models.BooleanField(default=False, verbose_name='is urgent')),
+                ('uid', models.UUIDField(editable=False)),
+                ('slug', models.SlugField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('received', models.DateField()),
+                ('r_from', models.CharField(max_length=255, verbose_name='received from')),
+                ('note', models.TextField(blank=True, null=True)),
+                ('sender', models.CharField(blank=True, max_length=255, null=True)),
+                ('dated', models.DateField()),
+                ('subject', models.CharField(max_length=255)),
+                ('phone', models.CharField(blank=True, max_length=15, null=True)),
+                ('phone1', models.CharField(blank=True, max_length=15, null=True)),
+                ('email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('file', models.CharField(blank=True, max_length=255)),
+                ('archive_file', models.CharField(blank=True, max_length=255)),
+                ('document_text', models.TextField(blank=True)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_incoming_created_by', to=settings.AUTH_USER_MODEL)),
+                ('updated_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_incoming_updated_by', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-dated'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedIncomingComment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('comment', models.TextField(null=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('comment_html', models.TextField(editable=False, null=True)),
+                ('comment_html_version', models.PositiveSmallIntegerField(default=0, editable=False)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_incoming_comment_created_by', to=settings.AUTH_USER_MODEL)),
+                ('incoming', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comments', to='posts.archivedincoming')),
+                ('updated_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_incoming_comment_updated_by', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedincoming',
+            index=models.Index(fields=['-dated', '-id'], name='posts_arch_dated_id_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,11 +1,30 @@
+import os
 import uuid
 
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.shortcuts import reverse
 from django.utils import timezone
 from django.utils.text import slugify
 from users.models import User
 
+from . import search, uploads
+from .rendering import MARKDOWN_RENDERER_VERSION, render_markdown
+
+
+class SearchedFieldsManager(models.Manager):
+    """
+    Leaves out ``fields``, which are only searched on and can hold a whole
+    document's text. ``defer(None)`` loads them when they are needed.
+    """
+
+    def __init__(self, *fields):
+        super().__init__()
+        self.searched_fields = fields
+
+    def get_queryset(self):
+        return super().get_queryset().defer(*self.searched_fields)
+
 
 class Incoming(models.Model):
     conf = models.BooleanField("is confidential",default=False)
@@ -30,18 +49,70 @@ class Incoming(models.Model):
     phone1 = models.CharField(max_length=15, null=True, blank=True)
     email = models.EmailField(max_length=254, null=True, blank=True)
     file = models.FileField(upload_to="incoming/")
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = SearchedFieldsManager("search_vector")
 
     class Meta:
         ordering = ["-dated"]
+        indexes = [
+            models.Index(fields=["-dated", "-id"], name="posts_inc_dated_id_idx"),
+            models.Index(
+                fields=["-dated", "-id"],
+                condition=models.Q(urgent=True),
+                name="posts_inc_urgent_dated_idx",
+            ),
+            models.Index(
+                fields=["-dated", "-id"],
+                condition=models.Q(conf=True),
+                name="posts_inc_conf_dated_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.uid)
         super(Incoming, self).save(*args, **kwargs)
+        search.index_incoming(self, using=kwargs.get("using") or self._state.db)
 
     def get_absolute_url(self):
         return reverse("incoming-detail", kwargs={"slug": self.slug})
 
+    @property
+    def document_filename(self):
+        # Stored names are content hashes, offer something readable instead.
+        extension = os.path.splitext(self.file.name)[1]
+        return f"{slugify(self.subject) or self.slug}{extension}"
+
+    def can_be_viewed_by(self, user):
+        if not self.conf:
+            return True
+        return (
+            user.is_superuser
+            or user.is_manager
+            or user.is_admin
+            or self.created_by_id == user.pk
+        )
+
+
+class IncomingSearchEntry(models.Model):
+    """Read-only view of the SQLite FTS5 search table, joined on rowid."""
+
+    incoming = models.OneToOneField(
+        Incoming,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="search_entry",
+    )
+    match = search.FtsMatchField(db_column=search.FTS_TABLE)
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = search.FTS_TABLE
+
 
 class IncomingComment(models.Model):
     incoming = models.ForeignKey(
@@ -64,14 +135,112 @@ class IncomingComment(models.Model):
         blank=True,
         related_name="incoming_comment_updated_by",
     )
+    comment_html = models.TextField(null=True, editable=False)
+    comment_html_version = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
 
+    def save(self, *args, **kwargs):
+        self.comment_html = render_markdown(self.comment)
+        self.comment_html_version = MARKDOWN_RENDERER_VERSION
+        super(IncomingComment, self).save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.incoming.incoming_name} - comment {self.pk}"
 
 
+class ArchivedIncoming(models.Model):
+    """
+    An Incoming moved out of the active register by archive_correspondence.
+
+    Keeps the original id, slug and dates. The document is recompressed
+    into cold storage and its extracted text is kept here for searching.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    conf = models.BooleanField("is confidential", default=False)
+    urgent = models.BooleanField("is urgent", default=False)
+    uid = models.UUIDField(editable=False)
+    slug = models.SlugField(unique=True, max_length=255)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="archived_incoming_created_by",
+    )
+    updated_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="archived_incoming_updated_by",
+    )
+    received = models.DateField()
+    r_from = models.CharField("received from", max_length=255)
+    note = models.TextField(blank=True, null=True)
+    sender = models.CharField(max_length=255, null=True, blank=True)
+    dated = models.DateField()
+    subject = models.CharField(max_length=255)
+    phone = models.CharField(max_length=15, null=True, blank=True)
+    phone1 = models.CharField(max_length=15, null=True, blank=True)
+    email = models.EmailField(max_length=254, null=True, blank=True)
+    # The name the document had in the active register, and its compressed
+    # copy relative to ARCHIVE_ROOT.
+    file = models.CharField(max_length=255, blank=True)
+    archive_file = models.CharField(max_length=255, blank=True)
+    document_text = models.TextField(blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = SearchedFieldsManager("document_text", "search_vector")
+
+    class Meta:
+        ordering = ["-dated"]
+        indexes = [
+            models.Index(fields=["-dated", "-id"], name="posts_arch_dated_id_idx"),
+        ]
+
+    def get_absolute_url(self):
+        return reverse("archived-incoming-detail", kwargs={"slug": self.slug})
+
+    @property
+    def document_filename(self):
+        extension = os.path.splitext(self.file)[1]
+        return f"{slugify(self.subject) or self.slug}{extension}"
+
+    can_be_viewed_by = Incoming.can_be_viewed_by
+
+
+class ArchivedIncomingComment(models.Model):
+    incoming = models.ForeignKey(
+        ArchivedIncoming, on_delete=models.CASCADE, related_name="comments"
+    )
+    comment = models.TextField(null=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="archived_incoming_comment_created_by",
+    )
+    updated_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="archived_incoming_comment_updated_by",
+    )
+    comment_html = models.TextField(null=True, editable=False)
+    comment_html_version = models.PositiveSmallIntegerField(default=0, editable=False)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+
 class Outgoing(models.Model):
     uid = models.UUIDField(default=uuid.uuid4, editable=False)
     slug = models.SlugField(unique=True, blank=True, null=True, max_length=255)
@@ -96,11 +265,24 @@ class Outgoing(models.Model):
 
     class Meta:
         ordering = ["-dated"]
+        indexes = [
+            models.Index(fields=["-dated", "-id"], name="posts_out_dated_id_idx"),
+            models.Index(
+                fields=["-dated", "-id"],
+                condition=models.Q(urgent=True),
+                name="posts_out_urgent_dated_idx",
+            ),
+            models.Index(
+                fields=["-dated", "-id"],
+                condition=models.Q(conf=True),
+                name="posts_out_conf_dated_idx",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.uid)
-        super(outgoing, self).save(*args, **kwargs)
+        super(Outgoing, self).save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse("outgoing-detail", kwargs={"slug": self.slug})
@@ -127,9 +309,159 @@ class OutgoingComment(models.Model):
         blank=True,
         related_name="outgoing_comment_updated_by",
     )
+    comment_html = models.TextField(null=True, editable=False)
+    comment_html_version = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ["-created_at"]
 
+    def save(self, *args, **kwargs):
+        self.comment_html = render_markdown(self.comment)
+        self.comment_html_version = MARKDOWN_RENDERER_VERSION
+        super(OutgoingComment, self).save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.outgoing.outgoing_name} - comment {self.pk}"
+
+
+class ChunkedUpload(models.Model):
+    UPLOADING = "uploading"
+    COMPLETE = "complete"
+    STATUS_CHOICES = [
+        (UPLOADING, "Uploading"),
+        (COMPLETE, "Complete"),
+    ]
+
+    uid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    created_by = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="chunked_uploads"
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=UPLOADING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+    @property
+    def part_path(self):
+        return uploads.part_path(self.uid)
+
+    @property
+    def is_complete(self):
+        return self.status == self.COMPLETE
+
+    def attach(self, field_file):
+        """
+        Move the assembled file into ``field_file`` (Incoming.file or
+        Outgoing.file) with a rename, without reading it back into memory,
+        or at all when its hash was kept while the chunks came in.
+        """
+        assembled = uploads.AssembledFile(
+            self.part_path, self.size, sha256=uploads.pop_file_hash(self)
+        )
+        field_file.save(self.filename, assembled, save=False)
+        self.delete()
+
+    def delete(self, *args, **kwargs):
+        uploads.remove_part(self.uid)
+        return super().delete(*args, **kwargs)
+
+
+class Blob(models.Model):
+    """A content-addressed file in storage and how many records use it."""
+
+    PREVIEW_PENDING = "pending"
+    PREVIEW_READY = "ready"
+    PREVIEW_UNAVAILABLE = "unavailable"
+    PREVIEW_FAILED = "failed"
+    PREVIEW_STATUS_CHOICES = [
+        (PREVIEW_PENDING, "Pending"),
+        (PREVIEW_READY, "Ready"),
+        (PREVIEW_UNAVAILABLE, "Unavailable"),
+        (PREVIEW_FAILED, "Failed"),
+    ]
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    preview_status = models.CharField(
+        max_length=11, choices=PREVIEW_STATUS_CHOICES, default=PREVIEW_PENDING
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+class DocumentText(models.Model):
+    """
+    Text extracted from a blob for search. Kept out of Incoming so list
+    queries never load it; keyed by the blob, so it is extracted once per
+    distinct document.
+    """
+
+    READY = "ready"
+    UNAVAILABLE = "unavailable"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (READY, "Ready"),
+        (UNAVAILABLE, "Unavailable"),
+        (FAILED, "Failed"),
+    ]
+
+    blob = models.OneToOneField(
+        Blob, on_delete=models.CASCADE, primary_key=True, related_name="text"
+    )
+    sha256 = models.CharField(max_length=64)
+    status = models.CharField(max_length=11, choices=STATUS_CHOICES)
+    text = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    extracted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.blob.name} ({self.status})"
+
+
+class RegisterVersion(models.Model):
+    """
+    One shard of a counter bumped on every change to a register, the
+    validator for its pages (see posts.versions).
+    """
+
+    name = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class RegisterStat(models.Model):
+    """One running count of the register dashboard, see posts.stats."""
+
+    register = models.CharField(max_length=20)
+    dimension = models.CharField(max_length=20)
+    key = models.CharField(max_length=255, blank=True)
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["register", "dimension", "key"],
+                name="posts_registerstat_bucket_unique",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["register", "dimension", "-count"],
+                name="posts_registerstat_count_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.register} {self.dimension} {self.key}: {self.count}"
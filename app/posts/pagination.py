@@ -0,0 +1,166 @@
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps([direction, values], cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        raise Http404("Invalid cursor.")
+    if direction not in ("next", "prev") or not isinstance(values, list):
+        raise Http404("Invalid cursor.")
+    return direction, values
+
+
+class KeysetPage:
+    """A page of results positioned by cursor instead of by page number."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate ``queryset`` by seeking past the last row seen on ``ordering``.
+
+    ``ordering`` must end in a unique field (normally ``id``) so every row
+    has a distinct position. Each page costs one LIMIT query, no COUNT and
+    no OFFSET, so page N is as cheap as page 1.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+        self.fields = [field.lstrip("-") for field in self.ordering]
+
+    def _seek(self, values, forward):
+        # Lexicographic "comes after" on (k1, k2, ...) spelled out as
+        # (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ...
+        clauses = []
+        for position, field in enumerate(self.ordering):
+            descending = field.startswith("-")
+            lookup = "lt" if descending == forward else "gt"
+            equal = {name: value for name, value in zip(self.fields, values[:position])}
+            equal[f"{self.fields[position]}__{lookup}"] = values[position]
+            clauses.append(Q(**equal))
+        return reduce(lambda left, right: left | right, clauses)
+
+    def _position(self, obj):
+        return [getattr(obj, field) for field in self.fields]
+
+    def _output_field(self, name):
+        try:
+            return self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # An annotation, like a search rank.
+            return self.queryset.query.annotations[name].output_field
+
+    def decode(self, cursor):
+        """The direction and position of ``cursor``, as the ordering's types."""
+        direction, values = decode_cursor(cursor)
+        if len(values) != len(self.fields):
+            raise Http404("Invalid cursor.")
+        try:
+            values = [
+                self._output_field(name).to_python(value)
+                for name, value in zip(self.fields, values)
+            ]
+        except (ValidationError, ValueError, TypeError):
+            raise Http404("Invalid cursor.")
+        if None in values:
+            raise Http404("Invalid cursor.")
+        return direction, values
+
+    def page(self, cursor=None):
+        direction, values = self.decode(cursor) if cursor else ("next", None)
+
+        forward = direction == "next"
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._seek(values, forward))
+        if forward:
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            queryset = queryset.order_by(*self._reversed_ordering())
+
+        rows = list(queryset[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([], None, None)
+
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            has_next, has_previous = True, has_more
+
+        return KeysetPage(
+            rows,
+            encode_cursor(self._position(rows[-1]), "next") if has_next else None,
+            encode_cursor(self._position(rows[0]), "prev") if has_previous else None,
+        )
+
+    def _reversed_ordering(self):
+        return [
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        ]
+
+
+class KeysetPaginationMixin:
+    """
+    Drop-in replacement for ListView's offset pagination.
+
+    Pages are addressed with an opaque ``cursor`` query parameter. The
+    queryset's own ordering is used when it ends in ``id``, otherwise
+    ``keyset_ordering``.
+    """
+
+    cursor_kwarg = "cursor"
+    keyset_ordering = ["-id"]
+
+    def get_keyset_ordering(self, queryset):
+        ordering = list(queryset.query.order_by)
+        if ordering and ordering[-1].lstrip("-") in ("id", "pk"):
+            return ordering
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(
+            queryset, page_size, self.get_keyset_ordering(queryset)
+        )
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return (paginator, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,80 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+# Rendered images are cached beside their blob as <sha256>.<kind>.png and,
+# like the blob, shared by every record that uses the document.
+PREVIEW_KINDS = ["thumbnail", "preview"]
+
+PDF_EXTENSIONS = {".pdf"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff", ".webp"}
+
+
+class PreviewUnavailable(Exception):
+    """No local tool can render this kind of document."""
+
+
+def preview_name(blob_name, kind):
+    return f"{os.path.splitext(blob_name)[0]}.{kind}.png"
+
+
+def preview_size(kind):
+    if kind == "thumbnail":
+        return settings.PREVIEW_THUMBNAIL_SIZE
+    return settings.PREVIEW_SIZE
+
+
+def render_command(source, target, size):
+    """The command that writes the first page of ``source`` to ``target``."""
+    extension = os.path.splitext(source)[1].lower()
+    if extension in PDF_EXTENSIONS and shutil.which("pdftoppm"):
+        # pdftoppm appends .png to the output prefix itself.
+        return [
+            "pdftoppm",
+            "-png",
+            "-singlefile",
+            "-f",
+            "1",
+            "-scale-to",
+            str(size),
+            source,
+            os.path.splitext(target)[0],
+        ]
+    if extension in PDF_EXTENSIONS | IMAGE_EXTENSIONS and shutil.which("convert"):
+        return [
+            "convert",
+            f"{source}[0]",
+            "-thumbnail",
+            f"{size}x{size}>",
+            "-background",
+            "white",
+            "-flatten",
+            f"png:{target}",
+        ]
+    raise PreviewUnavailable(f"No renderer for {extension or 'files without extension'}.")
+
+
+def render_previews(blob_name):
+    """Render every preview kind of a stored blob and save it beside it."""
+    source = default_storage.path(blob_name)
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in PREVIEW_KINDS:
+            target = os.path.join(directory, f"{kind}.png")
+            subprocess.run(
+                render_command(source, target, preview_size(kind)),
+                check=True,
+                capture_output=True,
+                timeout=settings.PREVIEW_TIMEOUT,
+            )
+            os.replace(target, default_storage.path(preview_name(blob_name, kind)))
+
+
+def delete_previews(blob_name):
+    for kind in PREVIEW_KINDS:
+        name = preview_name(blob_name, kind)
+        if default_storage.exists(name):
+            default_storage.delete(name)
@@ -0,0 +1,169 @@
+from django.apps import apps
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections
+from django.db.models import F, Lookup, OuterRef, Q, Subquery, TextField
+
+# SQLite FTS5 virtual table used when running on the DEBUG database.
+# rowid is the Incoming primary key.
+FTS_TABLE = "posts_incoming_fts"
+
+SEARCH_FIELDS = ["subject", "r_from", "sender", "note", "phone", "phone1"]
+
+# Extracted text of the attached document, the last and lowest-weighted
+# column of the index.
+DOCUMENT_FIELD = "document"
+
+SEARCH_CONFIG = "english"
+
+
+class FtsMatchField(TextField):
+    """The hidden FTS5 column named after its table, used for MATCH."""
+
+
+@FtsMatchField.register_lookup
+class FtsMatch(Lookup):
+    lookup_name = "fts_match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+def get_vendor(using):
+    return connections[using].vendor
+
+
+def document_text():
+    """The extracted text of an Incoming's file, read from DocumentText."""
+    DocumentText = apps.get_model("posts", "DocumentText")
+    return Subquery(
+        DocumentText.objects.filter(
+            blob__name=OuterRef("file"), status=DocumentText.READY
+        ).values("text")[:1]
+    )
+
+
+def incoming_search_vector():
+    return (
+        SearchVector("subject", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("r_from", "sender", weight="B", config=SEARCH_CONFIG)
+        + SearchVector("note", weight="C", config=SEARCH_CONFIG)
+        + SearchVector("phone", "phone1", weight="D", config=SEARCH_CONFIG)
+        + SearchVector(document_text(), weight="D", config=SEARCH_CONFIG)
+    )
+
+
+def fts_match_expression(query):
+    # Quote every term so user input can never be parsed as FTS5 syntax,
+    # and make each one a prefix match for search-as-you-type.
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"*' for term in terms if term)
+
+
+def index_incoming(incoming, using="default"):
+    """Refresh the search index entry for a single saved Incoming."""
+    index_incomings(type(incoming).objects.using(using).filter(pk=incoming.pk))
+
+
+def index_incomings(queryset):
+    """Refresh the search index for every row in ``queryset``."""
+    vendor = get_vendor(queryset.db)
+    if vendor == "postgresql":
+        queryset.update(search_vector=incoming_search_vector())
+    elif vendor == "sqlite":
+        columns = [*SEARCH_FIELDS, DOCUMENT_FIELD]
+        rows = list(
+            queryset.order_by()
+            .annotate(**{DOCUMENT_FIELD: document_text()})
+            .values_list("pk", *columns)
+        )
+        if not rows:
+            return
+        with connections[queryset.db].cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                [(row[0],) for row in rows],
+            )
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(columns)}) "
+                f"VALUES (%s, {', '.join(['%s'] * len(columns))})",
+                [
+                    (row[0], *(value or "" for value in row[1:]))
+                    for row in rows
+                ],
+            )
+
+
+def remove_from_index(pks, using="default"):
+    """Drop the SQLite index entries of Incoming rows leaving the table."""
+    if get_vendor(using) == "sqlite":
+        with connections[using].cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in pks]
+            )
+
+
+def clear_index(using="default"):
+    vendor = get_vendor(using)
+    if vendor == "sqlite":
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+
+def search_vector(queryset, query):
+    search_query = SearchQuery(query, search_type="websearch", config=SEARCH_CONFIG)
+    return (
+        queryset.filter(search_vector=search_query)
+        .annotate(rank=SearchRank(F("search_vector"), search_query))
+        .order_by("-rank", "-dated", "-id")
+    )
+
+
+def search_incoming(queryset, query):
+    """Filter ``queryset`` down to rows matching ``query``, best match first."""
+    query = query.strip()
+    if not query:
+        return queryset
+
+    vendor = get_vendor(queryset.db)
+    if vendor == "postgresql":
+        return search_vector(queryset, query)
+
+    if vendor == "sqlite":
+        match = fts_match_expression(query)
+        if not match:
+            return queryset.none()
+        # Join the FTS5 table through IncomingSearchEntry so the MATCH runs
+        # once and its bm25 rank (lower is better) can be sorted and paged on.
+        return (
+            queryset.filter(search_entry__match__fts_match=match)
+            .annotate(rank=F("search_entry__rank"))
+            .order_by("rank", "-dated", "-id")
+        )
+
+    # No indexed backend for this database, fall back to a plain scan.
+    q_objects = Q()
+    for field in SEARCH_FIELDS:
+        q_objects |= Q(**{f"{field}__icontains": query})
+    return queryset.filter(q_objects)
+
+
+def search_archive(queryset, query):
+    """
+    Filter ArchivedIncoming rows down to those matching ``query``.
+
+    PostgreSQL uses the search vector copied from the active register, other
+    databases scan for every term in the fields and the document text.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    if get_vendor(queryset.db) == "postgresql":
+        return search_vector(queryset, query)
+    for term in query.split():
+        q_objects = Q()
+        for field in [*SEARCH_FIELDS, "document_text"]:
+            q_objects |= Q(**{f"{field}__icontains": term})
+        queryset = queryset.filter(q_objects)
+    return queryset
@@ -0,0 +1,198 @@
+"""
+Register statistics kept as running counts in RegisterStat.
+
+Every record contributes 1 to a handful of buckets (the total, urgent,
+confidential, its month and its correspondent). Saves and deletes apply the
+difference between the buckets a record used to count in and the ones it
+counts in now, so the dashboard reads a few rows instead of grouping the
+whole register.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import Trim, TruncMonth
+from django.db.models.signals import post_delete, post_init, post_save
+
+TOTAL = "total"
+URGENT = "urgent"
+CONF = "conf"
+MONTH = "month"
+CORRESPONDENT = "correspondent"
+
+# Per register: the date field bucketed by month and the correspondent field.
+REGISTERS = {
+    "incoming": ("received", "r_from"),
+    "outgoing": ("dated", "add_to"),
+}
+
+
+# Archived records keep counting in the register they were moved out of.
+ARCHIVES = {"archivedincoming": "incoming"}
+
+
+def register_name(model):
+    name = model._meta.model_name
+    return ARCHIVES.get(name, name)
+
+
+def buckets(instance):
+    """The ``(dimension, key)`` buckets ``instance`` counts in."""
+    date_field, correspondent_field = REGISTERS[register_name(type(instance))]
+    result = [(TOTAL, "")]
+    if instance.urgent:
+        result.append((URGENT, ""))
+    if instance.conf:
+        result.append((CONF, ""))
+    # to_python turns an unsaved default (timezone.now) into the local date
+    # the database will store.
+    date = instance._meta.get_field(date_field).to_python(
+        getattr(instance, date_field)
+    )
+    if date:
+        result.append((MONTH, date.strftime("%Y-%m")))
+    correspondent = (getattr(instance, correspondent_field) or "").strip()
+    if correspondent:
+        result.append((CORRESPONDENT, correspondent[:255]))
+    return result
+
+
+def apply(register, deltas):
+    """Add ``deltas``, a mapping of ``(dimension, key)`` to counts."""
+    from .models import RegisterStat
+
+    with transaction.atomic():
+        for (dimension, key), delta in sorted(deltas.items()):
+            if not delta:
+                continue
+            updated = RegisterStat.objects.filter(
+                register=register, dimension=dimension, key=key
+            ).update(count=F("count") + delta)
+            if not updated:
+                stat, created = RegisterStat.objects.get_or_create(
+                    register=register,
+                    dimension=dimension,
+                    key=key,
+                    defaults={"count": delta},
+                )
+                if not created:
+                    RegisterStat.objects.filter(pk=stat.pk).update(
+                        count=F("count") + delta
+                    )
+
+
+def count(objects, sign=1):
+    """Count records saved or deleted in bulk, without signals."""
+    deltas = {}
+    for instance in objects:
+        deltas.setdefault(register_name(type(instance)), Counter()).update(
+            {bucket: sign for bucket in buckets(instance)}
+        )
+    for register, register_deltas in deltas.items():
+        apply(register, register_deltas)
+
+
+def remember_buckets(sender, instance, **kwargs):
+    # Deferred fields are left alone: the record counts as it was stored.
+    fields = {"urgent", "conf", *REGISTERS[register_name(sender)]}
+    if instance.pk is None or fields - instance.__dict__.keys():
+        instance._stat_buckets = None if instance.pk else []
+    else:
+        instance._stat_buckets = buckets(instance)
+
+
+def count_save(sender, instance, created, **kwargs):
+    old = [] if created else getattr(instance, "_stat_buckets", None)
+    if old is None:
+        # Loaded with deferred fields, the old buckets are unknown.
+        return
+    new = buckets(instance)
+    deltas = Counter(new)
+    deltas.subtract(old)
+    apply(register_name(sender), deltas)
+    instance._stat_buckets = new
+
+
+def count_delete(sender, instance, **kwargs):
+    old = getattr(instance, "_stat_buckets", None)
+    if old is None:
+        old = buckets(instance)
+    apply(register_name(sender), Counter({bucket: -1 for bucket in old}))
+
+
+def connect(model):
+    post_init.connect(remember_buckets, sender=model)
+    post_save.connect(count_save, sender=model)
+    post_delete.connect(count_delete, sender=model)
+
+
+def recount(model, stat_model):
+    """Count ``model``'s buckets from scratch, as unsaved ``stat_model`` rows."""
+    register = register_name(model)
+    date_field, correspondent_field = REGISTERS[register]
+    totals = model.objects.aggregate(
+        **{
+            TOTAL: Count("pk"),
+            URGENT: Count("pk", filter=Q(urgent=True)),
+            CONF: Count("pk", filter=Q(conf=True)),
+        }
+    )
+    rows = [
+        stat_model(register=register, dimension=dimension, count=totals[dimension])
+        for dimension in (TOTAL, URGENT, CONF)
+    ]
+    months = (
+        model.objects.exclude(**{f"{date_field}__isnull": True})
+        .annotate(month=TruncMonth(date_field))
+        .values("month")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    rows += [
+        stat_model(
+            register=register,
+            dimension=MONTH,
+            key=row["month"].strftime("%Y-%m"),
+            count=row["count"],
+        )
+        for row in months
+    ]
+    correspondents = (
+        model.objects.annotate(correspondent=Trim(correspondent_field))
+        .exclude(correspondent="")
+        .exclude(correspondent__isnull=True)
+        .values("correspondent")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+    rows += [
+        stat_model(
+            register=register,
+            dimension=CORRESPONDENT,
+            key=row["correspondent"][:255],
+            count=row["count"],
+        )
+        for row in correspondents
+    ]
+    return rows
+
+
+def rebuild(models, stat_model):
+    """
+    Replace every count with one recounted from ``models``, the registers
+    and their archives.
+    """
+    totals = Counter()
+    for model in models:
+        for row in recount(model, stat_model):
+            totals[row.register, row.dimension, row.key] += row.count
+    with transaction.atomic():
+        stat_model.objects.all().delete()
+        stat_model.objects.bulk_create(
+            [
+                stat_model(register=register, dimension=dimension, key=key, count=count)
+                for (register, dimension, key), count in totals.items()
+            ],
+            batch_size=1000,
+        )
@@ -0,0 +1,144 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler,
+    TemporaryFileUploadHandler,
+)
+from django.db import transaction
+
+BLOB_PREFIX = "blobs"
+
+READ_SIZE = 64 * 1024
+
+
+def blob_name(digest, filename):
+    extension = os.path.splitext(filename)[1].lower()
+    return "/".join([BLOB_PREFIX, digest[:2], digest[2:4], digest + extension])
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX + "/")
+
+
+def blob_digest(name):
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for data in iter(lambda: file.read(READ_SIZE), b""):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Store every file once, under ``blobs/ab/cd/<sha256><ext>``.
+
+    The ``upload_to`` directory of the field is ignored: identical
+    documents uploaded to Incoming and Outgoing share one blob, whose
+    references are counted by :mod:`posts.blobs`.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from content in _save, never rename to dodge
+        # an existing file.
+        return name
+
+    def _save(self, name, content):
+        digest = getattr(content, "sha256", None)
+        source = None
+        if hasattr(content, "temporary_file_path"):
+            source = content.temporary_file_path()
+            if digest is None:
+                digest = file_sha256(source)
+        elif digest is None:
+            # Spool to a temporary file next to the blobs, hashing as it
+            # is written, then move it in place.
+            os.makedirs(self.path(BLOB_PREFIX), exist_ok=True)
+            hasher = hashlib.sha256()
+            fd, source = tempfile.mkstemp(dir=self.path(BLOB_PREFIX), suffix=".tmp")
+            with os.fdopen(fd, "wb") as spool:
+                for data in content.chunks(READ_SIZE):
+                    hasher.update(data)
+                    spool.write(data)
+            digest = hasher.hexdigest()
+
+        target = blob_name(digest, name)
+        with transaction.atomic():
+            self.lock_blob(target)
+            stored = self.store(target, content, source)
+        if not stored and source is not None:
+            if not hasattr(content, "temporary_file_path"):
+                os.remove(source)
+        return target
+
+    def lock_blob(self, name):
+        """
+        Lock the Blob row of ``name``, if any, until the end of the
+        transaction. posts.blobs deletes unreferenced files under the same
+        lock, and only once they were not stored again for
+        BLOB_DELETE_GRACE seconds: the caller's reference comes well
+        within that.
+        """
+        from .models import Blob
+
+        Blob.objects.select_for_update().filter(name=name).first()
+
+    def store(self, target, content, source):
+        """Put the content in place, return False if it already was."""
+        full_path = self.path(target)
+        if os.path.exists(full_path):
+            # Restarts the deletion grace period of a file nothing
+            # references any more.
+            os.utime(full_path)
+            return False
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if source is not None:
+            try:
+                file_move_safe(source, full_path)
+            except FileExistsError:
+                # Same document stored concurrently, keep the first copy.
+                return False
+        else:
+            # In-memory upload already hashed by the upload handler.
+            with open(full_path, "wb") as destination:
+                for data in content.chunks(READ_SIZE):
+                    destination.write(data)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return True
+
+
+class HashingUploadMixin:
+    """Compute the SHA-256 of an uploaded file while it is received."""
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = hashlib.sha256()
+        return super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # An inactive memory handler only passes data on to the next one.
+        if getattr(self, "activated", True):
+            self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.files.storage import default_storage
+from jobs.queue import task
+
+from . import blobs, extraction, previews, search, versions
+from .models import Blob, DocumentText, Incoming
+from .storage import blob_digest
+
+
+@task(max_attempts=3)
+def generate_previews(blob_name):
+    blob = Blob.objects.filter(name=blob_name).first()
+    if blob is None:
+        return
+    try:
+        previews.render_previews(blob_name)
+    except previews.PreviewUnavailable:
+        status = Blob.PREVIEW_UNAVAILABLE
+    except Exception:
+        Blob.objects.filter(pk=blob.pk).update(preview_status=Blob.PREVIEW_FAILED)
+        raise
+    else:
+        status = Blob.PREVIEW_READY
+    Blob.objects.filter(pk=blob.pk).update(preview_status=status)
+    # List pages show the thumbnails.
+    versions.bump(versions.INCOMING)
+
+
+def needs_extraction(blob):
+    document = DocumentText.objects.filter(blob=blob).first()
+    return (
+        document is None
+        or document.status == DocumentText.FAILED
+        or document.sha256 != blob_digest(blob.name)
+    )
+
+
+def extraction_args(blob):
+    return (
+        default_storage.path(blob.name),
+        settings.EXTRACTED_TEXT_MAX_LENGTH,
+        settings.EXTRACTION_TIMEOUT,
+    )
+
+
+def store_document_text(blob, status, text="", error=""):
+    DocumentText.objects.update_or_create(
+        blob=blob,
+        defaults={
+            "sha256": blob_digest(blob.name),
+            "status": status,
+            "text": text,
+            "error": error,
+        },
+    )
+    if status == DocumentText.READY:
+        # Every record sharing the document becomes findable by its text.
+        search.index_incomings(Incoming.objects.filter(file=blob.name))
+        versions.bump(versions.INCOMING)
+
+
+@task(max_attempts=3)
+def delete_unreferenced_blob(blob_name):
+    retry_at = blobs.delete_if_unreferenced(blob_name)
+    if retry_at is not None:
+        blobs.queue_deletion(blob_name, run_at=retry_at)
+
+
+@task(max_attempts=3)
+def extract_document_text(blob_name):
+    blob = Blob.objects.filter(name=blob_name).first()
+    if blob is None or not needs_extraction(blob):
+        return
+    try:
+        text = extraction.extract_file(*extraction_args(blob))
+    except extraction.ExtractionUnavailable as error:
+        store_document_text(blob, DocumentText.UNAVAILABLE, error=str(error))
+    except Exception as error:
+        store_document_text(blob, DocumentText.FAILED, error=repr(error))
+        raise
+    else:
+        store_document_text(blob, DocumentText.READY, text)
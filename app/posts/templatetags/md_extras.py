@@ -1,7 +1,8 @@
 from django import template
 from django.template.defaultfilters import stringfilter
+from django.utils.safestring import mark_safe
 
-import markdown as md
+from posts.rendering import MARKDOWN_RENDERER_VERSION, render_markdown
 
 register = template.Library()
 
@@ -9,4 +10,16 @@ register = template.Library()
 @register.filter()
 @stringfilter
 def markdown(value):
-    return md.markdown(value, extensions=['markdown.extensions.fenced_code'])
\ No newline at end of file
+    return mark_safe(render_markdown(value))
+
+
+@register.filter()
+def comment_html(comment):
+    # Use the HTML stored at save time, only render live for rows written
+    # before the column existed or by an older renderer version.
+    if (
+        comment.comment_html is not None
+        and comment.comment_html_version == MARKDOWN_RENDERER_VERSION
+    ):
+        return mark_safe(comment.comment_html)
+    return mark_safe(render_markdown(comment.comment))
@@ -1,3 +1,1297 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.http import Http404, HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.views.generic import View
+
+from cf import streaming
+from jobs.models import Job
+from users.models import User
+
+from . import (
+    alerts,
+    archive,
+    extraction,
+    previews,
+    search,
+    tasks,
+    timeline,
+    versions,
+)
+from .conditional import ConditionalGetMixin
+from .models import (
+    ArchivedIncoming,
+    Blob,
+    ChunkedUpload,
+    DocumentText,
+    Incoming,
+    IncomingComment,
+    Outgoing,
+    RegisterStat,
+    RegisterVersion,
+)
+from .pagination import KeysetPaginator, encode_cursor
+from .rendering import MARKDOWN_RENDERER_VERSION, render_markdown
+from .storage import file_sha256
+
+
+class IncomingDetailQueryBudgetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="registry", email="registry@example.com", is_creator=True
+        )
+        self.client.force_login(self.user)
+
+    def create_incoming(self, comment_count):
+        incoming = Incoming.objects.create(
+            created_by=self.user,
+            updated_by=self.user,
+            r_from="Ministry of Finance",
+            dated=datetime.date(2024, 1, 1),
+            subject=f"Letter with {comment_count} comments",
+            file="incoming/letter.pdf",
+        )
+        authors = User.objects.bulk_create(
+            User(
+                username=f"author-{incoming.pk}-{i}",
+                email=f"author-{incoming.pk}-{i}@example.com",
+                slug=f"author-{incoming.pk}-{i}",
+            )
+            for i in range(comment_count)
+        )
+        html = render_markdown("A **comment**")
+        IncomingComment.objects.bulk_create(
+            IncomingComment(
+                incoming=incoming,
+                comment="A **comment**",
+                comment_html=html,
+                comment_html_version=MARKDOWN_RENDERER_VERSION,
+                created_by=author,
+                updated_by=author,
+            )
+            for author in authors
+        )
+        return incoming
+
+    def count_queries(self, incoming):
+        url = reverse("incoming-detail", kwargs={"slug": incoming.slug})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_query_count_is_constant(self):
+        # The first request caches the session and user.
+        self.count_queries(self.create_incoming(1))
+        baseline = self.count_queries(self.create_incoming(1))
+        for comment_count in (10, 100, 500):
+            with self.subTest(comment_count=comment_count):
+                incoming = self.create_incoming(comment_count)
+                self.assertEqual(self.count_queries(incoming), baseline)
+
+    def test_search_vector_is_not_loaded(self):
+        incoming = self.create_incoming(1)
+        for url in (
+            reverse("incoming-list"),
+            reverse("incoming-detail", kwargs={"slug": incoming.slug}),
+        ):
+            with self.subTest(url=url), CaptureQueriesContext(connection) as context:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertFalse(
+                [
+                    query
+                    for query in context.captured_queries
+                    if '"search_vector"' in query["sql"].split(" FROM ")[0]
+                ]
+            )
+
+    def test_renders_every_comment_author(self):
+        incoming = self.create_incoming(3)
+        response = self.client.get(
+            reverse("incoming-detail", kwargs={"slug": incoming.slug})
+        )
+        for comment in incoming.comments.all():
+            self.assertContains(response, comment.created_by.get_absolute_url())
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="registry", email="registry@example.com", is_creator=True
+        )
+
+    def create_incoming(self, subject, **kwargs):
+        return Incoming.objects.create(
+            created_by=self.user,
+            updated_by=self.user,
+            r_from="Ministry of Finance",
+            dated=datetime.date(2024, 1, 1),
+            subject=subject,
+            **kwargs,
+        )
+
+    def search(self, query):
+        return list(
+            search.search_incoming(Incoming.objects.all(), query).values_list(
+                "subject", flat=True
+            )
+        )
+
+    def test_finds_words_and_prefixes_in_every_field(self):
+        self.create_incoming("Culvert repairs")
+        self.create_incoming("Road budget", sender="Jane Mwangi", phone="5551234")
+        self.create_incoming("Bridge survey", note="Includes the culvert")
+        self.assertEqual(self.search("mwangi"), ["Road budget"])
+        self.assertEqual(self.search("5551234"), ["Road budget"])
+        self.assertEqual(self.search("bud"), ["Road budget"])
+        self.assertEqual(self.search("ministry road"), ["Road budget"])
+        self.assertEqual(self.search("nothing"), [])
+        # A match in the subject ranks above one in the note.
+        self.assertEqual(self.search("culvert"), ["Culvert repairs", "Bridge survey"])
+
+    def test_query_syntax_is_searched_as_text(self):
+        self.create_incoming('Budget "draft" OR final')
+        for query in ('"draft', "OR", "budget AND", "NEAR(", "*", "   "):
+            with self.subTest(query=query):
+                self.search(query)
+        self.assertEqual(self.search('"draft'), ['Budget "draft" OR final'])
+
+    def test_index_follows_saves_and_deletes(self):
+        incoming = self.create_incoming("Culvert repairs")
+        incoming.subject = "Road budget"
+        incoming.save()
+        self.assertEqual(self.search("culvert"), [])
+        self.assertEqual(self.search("road"), ["Road budget"])
+        incoming.delete()
+        self.assertEqual(self.search("road"), [])
+
+    def test_rebuild_search_index(self):
+        for i in range(5):
+            self.create_incoming(f"Culvert repairs {i}")
+        search.clear_index()
+        Incoming.objects.update(search_vector=None)
+        self.assertEqual(self.search("culvert"), [])
+        call_command("rebuild_search_index", batch_size=2, stdout=StringIO())
+        self.assertEqual(len(self.search("culvert")), 5)
+
+    def test_list_view(self):
+        self.create_incoming("Culvert repairs")
+        self.create_incoming("Road budget")
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("incoming-list"), {"q": "culvert"})
+        self.assertContains(response, "Culvert repairs")
+        self.assertNotContains(response, "Road budget")
+
+
+class KeysetPaginatorTest(TestCase):
+    def setUp(self):
+        user = User.objects.create(username="registry", email="registry@example.com")
+        for day, subject in [
+            (1, "Culvert repairs"),
+            (2, "Culvert culvert culvert"),
+            (2, "Bridge survey"),
+            (2, "Culvert report"),
+            (3, "Road budget"),
+        ]:
+            Incoming.objects.create(
+                created_by=user,
+                updated_by=user,
+                r_from="Ministry of Finance",
+                dated=datetime.date(2024, 1, day),
+                subject=subject,
+            )
+
+    def walk(self, paginator):
+        """Page forward to the end and back, returning the pks seen forward."""
+        pages, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            pages.append([incoming.pk for incoming in page])
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        for previous in reversed(pages[:-1]):
+            page = paginator.page(page.previous_cursor)
+            self.assertEqual([incoming.pk for incoming in page], previous)
+        self.assertFalse(page.has_previous())
+        return [pk for page in pages for pk in page]
+
+    def test_forward_and_back_through_ties(self):
+        queryset = Incoming.objects.all()
+        paginator = KeysetPaginator(queryset, 2, ["-dated", "-id"])
+        self.assertEqual(
+            self.walk(paginator),
+            list(queryset.order_by("-dated", "-id").values_list("pk", flat=True)),
+        )
+
+    def test_ranked_search(self):
+        queryset = search.search_incoming(Incoming.objects.all(), "culvert")
+        paginator = KeysetPaginator(queryset, 1, queryset.query.order_by)
+        expected = list(queryset.values_list("pk", flat=True))
+        self.assertEqual(len(expected), 3)
+        self.assertEqual(self.walk(paginator), expected)
+
+    def test_invalid_cursors(self):
+        paginator = KeysetPaginator(Incoming.objects.all(), 2, ["-dated", "-id"])
+        cursors = [
+            "not a cursor",
+            encode_cursor(["2024-01-02", 1], "sideways"),
+            encode_cursor([], "next"),
+            encode_cursor(["2024-01-02"], "next"),
+            encode_cursor(["2024-01-02", 1, 2], "next"),
+            encode_cursor(["yesterday", 1], "next"),
+            encode_cursor(["2024-02-30", 1], "next"),
+            encode_cursor(["2024-01-02", "one"], "prev"),
+            encode_cursor([None, 1], "next"),
+            encode_cursor([["2024-01-02"], {}], "next"),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor), self.assertRaises(Http404):
+                paginator.page(cursor)
+
+
+class RenderMarkdownTest(TestCase):
+    def test_drops_script_links(self):
+        for text in (
+            "[x](javascript:alert(1))",
+            "[x](&#106;avascript:alert(1))",
+            "[x](javascript&#58;alert(1))",
+            "[x](java&#x09;script:alert(1))",
+            "![x](&#x6A;avascript:alert(1))",
+        ):
+            with self.subTest(text=text):
+                html = render_markdown(text)
+                self.assertNotIn("href", html)
+                self.assertNotIn("src", html)
+
+    def test_keeps_safe_links(self):
+        for url in (
+            "https://example.com/",
+            "mailto:registry@example.com",
+            "/a:b",
+            "#top",
+        ):
+            with self.subTest(url=url):
+                self.assertIn(f'href="{url}"', render_markdown(f"[x]({url})"))
+
+
+class IncomingDownloadTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, PROTECTED_MEDIA_X_ACCEL=False
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.owner = User.objects.create(
+            username="owner", email="owner@example.com", is_creator=True
+        )
+        self.other = User.objects.create(
+            username="other", email="other@example.com", is_creator=True
+        )
+        self.incoming = Incoming(
+            created_by=self.owner,
+            updated_by=self.owner,
+            r_from="Ministry of Finance",
+            dated=datetime.date(2024, 1, 1),
+            subject="Scanned letter",
+        )
+        self.incoming.file.save("letter.pdf", ContentFile(b"0123456789"), save=False)
+        self.incoming.save()
+        self.url = reverse("incoming-download", kwargs={"slug": self.incoming.slug})
+
+    def test_full_download(self):
+        self.client.force_login(self.other)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+    def test_range_download(self):
+        self.client.force_login(self.other)
+        response = self.client.get(self.url, headers={"Range": "bytes=2-5"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+
+        response = self.client.get(self.url, headers={"Range": "bytes=-3"})
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+
+        response = self.client.get(self.url, headers={"Range": "bytes=20-"})
+        self.assertEqual(response.status_code, 416)
+
+    def test_confidential_download(self):
+        Incoming.objects.filter(pk=self.incoming.pk).update(conf=True)
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    @override_settings(PROTECTED_MEDIA_X_ACCEL=True)
+    def test_accel_redirect(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["X-Accel-Redirect"], f"/protected-media/{self.incoming.file.name}"
+        )
+        self.assertEqual(response.content, b"")
+
+    def test_identical_documents_share_one_blob(self):
+        copy = Incoming(
+            created_by=self.other,
+            updated_by=self.other,
+            r_from="Ministry of Finance",
+            dated=datetime.date(2024, 1, 2),
+            subject="Same letter again",
+        )
+        copy.file.save("copy.pdf", ContentFile(b"0123456789"), save=False)
+        copy.save()
+
+        self.assertEqual(copy.file.name, self.incoming.file.name)
+        self.assertTrue(copy.file.name.startswith("blobs/84/d8/"))
+        self.assertEqual(Blob.objects.get(name=copy.file.name).ref_count, 2)
+
+        copy.delete()
+        self.assertEqual(Blob.objects.get(name=copy.file.name).ref_count, 1)
+        self.incoming.delete()
+        self.assertEqual(Blob.objects.get(name=copy.file.name).ref_count, 0)
+
+    def test_unreferenced_file_is_deleted_after_a_grace_period(self):
+        name = self.incoming.file.name
+        path = os.path.join(self.media_root, name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.incoming.delete()
+        self.assertTrue(
+            Job.objects.filter(
+                task="posts.tasks.delete_unreferenced_blob", args=[name]
+            ).exists()
+        )
+
+        # The same content is stored again, the deletion runs before the
+        # new record takes its reference: the file stays.
+        expired = time.time() - settings.BLOB_DELETE_GRACE - 1
+        os.utime(path, (expired, expired))
+        copy = Incoming(
+            created_by=self.other,
+            updated_by=self.other,
+            r_from="Ministry of Finance",
+            dated=datetime.date(2024, 1, 2),
+            subject="Same letter again",
+        )
+        copy.file.save("copy.pdf", ContentFile(b"0123456789"), save=False)
+        tasks.delete_unreferenced_blob(name)
+        copy.save()
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(Blob.objects.get(name=name).ref_count, 1)
+
+        copy.delete()
+        os.utime(path, (expired, expired))
+        tasks.delete_unreferenced_blob(name)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_preview(self):
+        url = reverse(
+            "incoming-preview", kwargs={"slug": self.incoming.slug, "kind": "thumbnail"}
+        )
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        name = previews.preview_name(self.incoming.file.name, "thumbnail")
+        self.assertTrue(name.endswith(".thumbnail.png"))
+        with open(os.path.join(self.media_root, name), "wb") as file:
+            file.write(b"png")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/png")
+
+        Incoming.objects.filter(pk=self.incoming.pk).update(conf=True)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_new_document_queues_processing(self):
+        incoming = Incoming(
+            created_by=self.owner,
+            updated_by=self.owner,
+            r_from="Ministry of Finance",
+            dated=datetime.date(2024, 1, 2),
+            subject="Another letter",
+        )
+        incoming.file.save("other.pdf", ContentFile(b"other"), save=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            incoming.save()
+        self.assertEqual(
+            list(Job.objects.order_by("pk").values_list("task", "args")),
+            [
+                ("posts.tasks.generate_previews", [incoming.file.name]),
+                ("posts.tasks.extract_document_text", [incoming.file.name]),
+            ],
+        )
+
+
+class ChunkedUploadTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            CHUNKED_UPLOAD_DIR=os.path.join(self.media_root, "chunked_uploads"),
+            CHUNKED_UPLOAD_CHUNK_SIZE=4,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create(
+            username="registry", email="registry@example.com", is_creator=True
+        )
+        self.client.force_login(self.user)
+        self.content = b"0123456789"
+
+    def create_upload(self):
+        response = self.client.post(
+            reverse("upload-create"),
+            json.dumps({"filename": "scan.pdf", "size": len(self.content)}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def send_chunk(self, upload_id, offset, data, checksum=None):
+        return self.client.post(
+            reverse("upload-chunk", kwargs={"uid": upload_id}),
+            data,
+            content_type="application/octet-stream",
+            headers={
+                "X-Upload-Offset": str(offset),
+                "X-Chunk-Checksum": checksum or hashlib.sha256(data).hexdigest(),
+            },
+        )
+
+    def upload(self):
+        upload = self.create_upload()
+        offset = 0
+        while offset < len(self.content):
+            chunk = self.content[offset : offset + upload["chunk_size"]]
+            upload = self.send_chunk(upload["id"], offset, chunk).json()
+            offset = upload["offset"]
+        self.assertTrue(upload["complete"])
+        return upload
+
+    def test_resume_and_checksum(self):
+        upload = self.create_upload()
+        self.assertEqual(self.send_chunk(upload["id"], 0, b"0123").status_code, 200)
+
+        # Wrong offset: the server answers with where to resume from.
+        response = self.send_chunk(upload["id"], 0, b"0123")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 4)
+
+        response = self.send_chunk(upload["id"], 4, b"4567", checksum="0" * 64)
+        self.assertEqual(response.status_code, 400)
+        status = self.client.get(reverse("upload-status", kwargs={"uid": upload["id"]}))
+        self.assertEqual(status.json()["offset"], 4)
+
+        self.assertEqual(self.send_chunk(upload["id"], 4, b"4567").status_code, 200)
+        response = self.send_chunk(upload["id"], 8, b"89")
+        self.assertTrue(response.json()["complete"])
+
+    def test_attach_to_incoming(self):
+        upload = self.upload()
+        response = self.client.post(
+            reverse("incoming-create"),
+            {
+                "received": "2024-01-01",
+                "r_from": "Ministry of Finance",
+                "dated": "2024-01-01",
+                "subject": "Large scan",
+                "upload_id": upload["id"],
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        incoming = Incoming.objects.get()
+        with incoming.file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+    def test_attach_uses_the_hash_kept_while_uploading(self):
+        upload = self.upload()
+        with mock.patch("posts.storage.file_sha256") as file_sha256:
+            response = self.client.post(
+                reverse("incoming-create"),
+                {
+                    "received": "2024-01-01",
+                    "r_from": "Ministry of Finance",
+                    "dated": "2024-01-01",
+                    "subject": "Large scan",
+                    "upload_id": upload["id"],
+                },
+            )
+        self.assertEqual(response.status_code, 302)
+        file_sha256.assert_not_called()
+        digest = hashlib.sha256(self.content).hexdigest()
+        self.assertIn(digest, Incoming.objects.get().file.name)
+
+
+class ImportCorrespondenceTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(self.directory, "media")
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        User.objects.create(username="registry", email="registry@example.com")
+        with open(os.path.join(self.directory, "letter.pdf"), "wb") as file:
+            file.write(b"%PDF-1.4 letter")
+        self.path = os.path.join(self.directory, "register.csv")
+        with open(self.path, "w") as file:
+            file.write(
+                "conf,urgent,received,r_from,dated,subject,file\n"
+                "0,1,2001-02-03,Ministry of Finance,2001-02-01,Road budget,letter.pdf\n"
+                "0,0,not a date,Ministry of Health,2001-02-01,Rejected,\n"
+                "1,0,2001-03-03,Ministry of Health,2001-03-01,Clinic,letter.pdf\n"
+            )
+
+    def import_register(self, **options):
+        call_command(
+            "import_correspondence",
+            self.path,
+            user="registry",
+            files_dir=self.directory,
+            batch_size=1,
+            stdout=StringIO(),
+            stderr=StringIO(),
+            **options,
+        )
+
+    def test_import(self):
+        self.import_register()
+        self.assertEqual(
+            list(
+                Incoming.objects.order_by("subject").values_list(
+                    "subject", "conf", "urgent"
+                )
+            ),
+            [("Clinic", True, False), ("Road budget", False, True)],
+        )
+        # Both rows share one stored document.
+        self.assertEqual(Blob.objects.get().ref_count, 2)
+        self.assertFalse(os.path.exists(f"{self.path}.checkpoint"))
+
+    def test_resume_from_checkpoint(self):
+        with open(f"{self.path}.checkpoint", "w") as file:
+            json.dump({"source": file_sha256(self.path), "line": 3}, file)
+        self.import_register()
+        self.assertEqual(Incoming.objects.get().subject, "Clinic")
+
+        # Replaying rows that were already imported creates no duplicates.
+        self.import_register()
+        self.assertEqual(Incoming.objects.count(), 2)
+
+    def test_files_with_the_same_name(self):
+        self.import_register()
+        os.makedirs(os.path.join(self.directory, "2020"))
+        self.path = os.path.join(self.directory, "2020", "register.csv")
+        with open(self.path, "w") as file:
+            file.write(
+                "conf,urgent,received,r_from,dated,subject\n"
+                "0,0,2020-02-03,Ministry of Finance,2020-02-01,Road budget 2020\n"
+            )
+        self.import_register()
+        self.assertEqual(Incoming.objects.count(), 3)
+
+
+class IncomingExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="registry", email="registry@example.com", is_creator=True
+        )
+        self.client.force_login(self.user)
+        for day, urgent in [(1, True), (2, False), (20, True)]:
+            Incoming.objects.create(
+                created_by=self.user,
+                updated_by=self.user,
+                r_from="Ministry of Finance",
+                dated=datetime.date(2024, 1, day),
+                subject=f"Letter {day}",
+                urgent=urgent,
+                file="incoming/letter.pdf",
+            )
+
+    def export(self, **params):
+        response = self.client.get(reverse("incoming-export"), params)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_csv_uses_list_filters(self):
+        lines = self.export(
+            urgent="1", date_from="2024-01-01", date_to="2024-01-10"
+        ).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("Received,Dated,From"))
+        self.assertIn("Letter 1", lines[1])
+
+    def test_xlsx(self):
+        archive = zipfile.ZipFile(BytesIO(self.export(format="xlsx")))
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(sheet.count("<row "), 4)
+        self.assertLess(sheet.index("Letter 20"), sheet.index("Letter 1<"))
+
+    def test_impossible_dates_are_ignored(self):
+        lines = self.export(date_from="2024-02-30").decode().splitlines()
+        self.assertEqual(len(lines), 4)
+        response = self.client.get(reverse("incoming-list"), {"date_to": "2024-13-01"})
+        self.assertEqual(response.status_code, 200)
+
+    def test_formulas_are_exported_as_text(self):
+        Incoming.objects.filter(subject="Letter 1").update(
+            subject='=HYPERLINK("http://example.com")', r_from="@SUM(A1)"
+        )
+        content = self.export().decode()
+        self.assertIn("'=HYPERLINK", content)
+        self.assertIn("'@SUM(A1)", content)
+        sheet = zipfile.ZipFile(BytesIO(self.export(format="xlsx"))).read(
+            "xl/worksheets/sheet1.xml"
+        )
+        self.assertIn(b"'=HYPERLINK", sheet)
+
+    async def test_not_buffered_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        with mock.patch.object(streaming, "BATCH_SIZE", 1):
+            response = await self.async_client.get(reverse("incoming-export"))
+            self.assertTrue(response.is_async)
+            parts = [part async for part in response.streaming_content]
+        # One row per read: nothing was loaded ahead of what was sent.
+        self.assertEqual(len(parts), 4)
+        self.assertTrue(parts[0].startswith(b"Received,Dated,From"))
+
+
+class DocumentTextTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create(
+            username="registry", email="registry@example.com", is_creator=True
+        )
+
+    def create_incoming(self, subject, filename, content):
+        incoming = Incoming(
+            created_by=self.user,
+            updated_by=self.user,
+            r_from="Ministry of Finance",
+            dated=datetime.date(2024, 1, 1),
+            subject=subject,
+        )
+        incoming.file.save(filename, ContentFile(content), save=False)
+        incoming.save()
+        return incoming
+
+    def search(self, query):
+        return list(
+            search.search_incoming(Incoming.objects.all(), query).values_list(
+                "subject", flat=True
+            )
+        )
+
+    def test_extracted_text_is_searchable(self):
+        first = self.create_incoming("Letter", "a.txt", b"Culvert  repairs\n\n\n")
+        self.create_incoming("Copy", "b.txt", b"Culvert  repairs\n\n\n")
+        self.assertEqual(self.search("culvert"), [])
+
+        tasks.extract_document_text(first.file.name)
+        document = DocumentText.objects.get()
+        self.assertEqual(document.status, DocumentText.READY)
+        self.assertEqual(document.text, "Culvert repairs")
+        # Both records share the blob, both are indexed with its text.
+        self.assertCountEqual(self.search("culvert"), ["Letter", "Copy"])
+
+    def test_unsupported_document(self):
+        incoming = self.create_incoming("Photo", "a.bin", b"\x00\x01")
+        tasks.extract_document_text(incoming.file.name)
+        self.assertEqual(DocumentText.objects.get().status, DocumentText.UNAVAILABLE)
+
+    def test_reads_no_more_than_it_keeps(self):
+        text_path = os.path.join(self.media_root, "large.txt")
+        with open(text_path, "wb") as file:
+            file.write("é".encode() * 100_000)
+        document_path = os.path.join(self.media_root, "large.docx")
+        paragraph = "<w:p><w:r><w:t>Culvert repairs</w:t></w:r></w:p>"
+        with zipfile.ZipFile(document_path, "w", zipfile.ZIP_DEFLATED) as document:
+            document.writestr("word/document.xml", paragraph * 100_000)
+
+        with mock.patch.object(extraction, "decode", wraps=extraction.decode) as decode:
+            text = extraction.extract_file(text_path, 5, 10)
+            self.assertEqual(text, "ééééé")
+            self.assertEqual(len(decode.call_args.args[0]), 5 * 4)
+
+            text = extraction.extract_file(document_path, 20, 10)
+            self.assertEqual(text, "Culvert repairs\nCulv")
+            self.assertEqual(len(decode.call_args_list[-1].args[0]), 20 * 32)
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="registry", email="registry@example.com", is_creator=True
+        )
+        self.client.force_login(self.user)
+        self.incoming = Incoming.objects.create(
+            created_by=self.user,
+            updated_by=self.user,
+            r_from="Ministry of Finance",
+            dated=datetime.date(2024, 1, 1),
+            subject="Letter",
+            file="incoming/letter.pdf",
+        )
+
+    def revalidate(self, url, response, **params):
+        return self.client.get(
+            url, params, headers={"If-None-Match": response["ETag"]}
+        )
+
+    def test_detail(self):
+        url = self.incoming.get_absolute_url()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+
+        with self.assertTemplateNotUsed("posts/incoming_detail.html"):
+            self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+        IncomingComment.objects.create(
+            incoming=self.incoming,
+            comment="New comment",
+            created_by=self.user,
+            updated_by=self.user,
+        )
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_list(self):
+        url = reverse("incoming-list")
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        # Another filter is another page.
+        self.assertEqual(self.revalidate(url, response, urgent="1").status_code, 200)
+
+        self.incoming.urgent = True
+        self.incoming.save()
+        response = self.revalidate(url, response)
+        self.assertEqual(response.status_code, 200)
+
+        self.incoming.delete()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_no_validators_no_etag(self):
+        class PlainView(ConditionalGetMixin, View):
+            def get(self, request):
+                return HttpResponse("Page")
+
+        request = RequestFactory().get("/", headers={"If-None-Match": "*"})
+        response = PlainView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+
+    def test_version_is_sharded(self):
+        for _ in range(50):
+            versions.bump(versions.INCOMING)
+        self.assertGreater(RegisterVersion.objects.count(), 1)
+        self.assertEqual(
+            versions.current(versions.INCOMING)[0],
+            [RegisterVersion.objects.aggregate(total=Sum("version"))["total"]],
+        )
+
+    def test_author_changes(self):
+        url = self.incoming.get_absolute_url()
+        response = self.client.get(url)
+        self.user.first_name = "Renamed"
+        self.user.save()
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_login_and_hidden_fields_keep_the_users_version(self):
+        before = versions.current(versions.USERS)
+        self.user.set_password("secret")
+        self.user.save()
+        self.client.login(username="registry", password="secret")
+        self.user.phone = "1234567"
+        self.user.save()
+        self.assertEqual(versions.current(versions.USERS), before)
+
+        self.user.is_manager = True
+        self.user.save()
+        self.assertNotEqual(versions.current(versions.USERS), before)
+
+
+class RegisterStatsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="manager", email="manager@example.com", is_manager=True
+        )
+
+    def create_incoming(self, **kwargs):
+        fields = {
+            "created_by": self.user,
+            "updated_by": self.user,
+            "r_from": "Ministry of Finance",
+            "received": datetime.date(2024, 1, 5),
+            "dated": datetime.date(2024, 1, 1),
+            "subject": "Letter",
+            "file": "incoming/letter.pdf",
+        }
+        return Incoming.objects.create(**{**fields, **kwargs})
+
+    def counts(self):
+        return {
+            (dimension, key): count
+            for dimension, key, count in RegisterStat.objects.filter(
+                register="incoming", count__gt=0
+            ).values_list("dimension", "key", "count")
+        }
+
+    def test_counts_follow_saves_and_deletes(self):
+        first = self.create_incoming(urgent=True)
+        self.create_incoming(conf=True, r_from="Ministry of Health")
+        first = Incoming.objects.get(pk=first.pk)
+        first.urgent = False
+        first.received = datetime.date(2024, 2, 1)
+        first.save()
+
+        expected = {
+            ("total", ""): 2,
+            ("conf", ""): 1,
+            ("month", "2024-01"): 1,
+            ("month", "2024-02"): 1,
+            ("correspondent", "Ministry of Finance"): 1,
+            ("correspondent", "Ministry of Health"): 1,
+        }
+        self.assertEqual(self.counts(), expected)
+
+        call_command("rebuild_register_stats", stdout=StringIO())
+        self.assertEqual(self.counts(), expected)
+
+        first.delete()
+        self.assertEqual(
+            self.counts(),
+            {
+                ("total", ""): 1,
+                ("conf", ""): 1,
+                ("month", "2024-01"): 1,
+                ("correspondent", "Ministry of Health"): 1,
+            },
+        )
+
+    def test_dashboard(self):
+        self.create_incoming(urgent=True)
+        self.client.force_login(self.user)
+        # The session and user, then three reads per register.
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse("stats-dashboard"))
+        self.assertContains(response, "Ministry of Finance")
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="registry", email="registry@example.com", is_creator=True
+        )
+        dates = [datetime.date(2024, 1, day) for day in (1, 2, 2, 3, 3, 3)]
+        for day in dates:
+            Incoming.objects.create(
+                created_by=self.user,
+                updated_by=self.user,
+                r_from="Ministry of Finance",
+                dated=day,
+                subject=f"In {day}",
+                file="incoming/letter.pdf",
+            )
+        for day in dates[1:4]:
+            Outgoing.objects.create(
+                created_by=self.user,
+                updated_by=self.user,
+                sender=self.user,
+                add_to="Ministry of Health",
+                dated=day,
+                subject=f"Out {day}",
+                file="outgoing/letter.pdf",
+            )
+        self.expected = sorted(
+            [
+                [record.dated, kind, record.pk]
+                for kind, model in [("incoming", Incoming), ("outgoing", Outgoing)]
+                for record in model.objects.all()
+            ],
+            reverse=True,
+        )
+
+    def test_outgoing_gets_a_slug(self):
+        self.assertFalse(Outgoing.objects.filter(slug__isnull=True).exists())
+
+    def test_pages_forward_and_back(self):
+        paginator = timeline.TimelinePaginator(per_page=2)
+        pages, cursor = [], None
+        while True:
+            with self.assertNumQueries(1):
+                page = paginator.page(cursor)
+            pages.append(page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        seen = [entry.position for page in pages for entry in page]
+        self.assertEqual(seen, self.expected)
+
+        page = pages[-1]
+        for previous in reversed(pages[:-1]):
+            page = paginator.page(page.previous_cursor)
+            self.assertEqual(
+                [entry.position for entry in page],
+                [entry.position for entry in previous],
+            )
+        self.assertFalse(page.has_previous())
+
+    def test_api_filters_by_kind(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("timeline-api"), {"kind": "outgoing"})
+        data = response.json()
+        self.assertEqual(
+            [entry["kind"] for entry in data["results"]], ["outgoing"] * 3
+        )
+        self.assertIsNone(data["next"])
+
+        response = self.client.get(reverse("timeline"), {"urgent": "1"})
+        self.assertContains(response, "No correspondence")
+
+    def test_impossible_dates_are_ignored(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("timeline-api"),
+            {"date_from": "2024-02-30", "date_to": "2024-01-02"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {entry["dated"] for entry in response.json()["results"]},
+            {"2024-01-01", "2024-01-02"},
+        )
+
+    def test_invalid_cursors(self):
+        paginator = timeline.TimelinePaginator(per_page=2)
+        cursors = [
+            encode_cursor(["2024-01-02", ["incoming"], 1], "next"),
+            encode_cursor(["2024-01-02", {}, 1], "next"),
+            encode_cursor(["2024-01-02", "letter", 1], "next"),
+            encode_cursor(["2024-01-02", "incoming", "one"], "next"),
+            encode_cursor(["2024-01-02", "incoming", [1]], "next"),
+            encode_cursor(["2024-01-02", "incoming", float("inf")], "next"),
+            encode_cursor([["2024-01-02"], "incoming", 1], "next"),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor), self.assertRaises(Http404):
+                paginator.page(cursor)
+
+
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root,
+            ARCHIVE_ROOT=os.path.join(self.media_root, "archive"),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create(
+            username="registry", email="registry@example.com", is_creator=True
+        )
+        self.old = self.create_incoming("Old letter", datetime.date(2010, 3, 1))
+        IncomingComment.objects.create(
+            incoming=self.old, comment="Filed.", created_by=self.user
+        )
+        tasks.extract_document_text(self.old.file.name)
+        self.new = self.create_incoming("New letter", datetime.date(2024, 3, 1))
+
+    def create_incoming(self, subject, received):
+        incoming = Incoming(
+            created_by=self.user,
+            updated_by=self.user,
+            r_from="Ministry of Finance",
+            received=received,
+            dated=received,
+            subject=subject,
+        )
+        content = ContentFile(f"{subject} about culverts".encode())
+        incoming.file.save(f"{subject}.txt", content, save=False)
+        incoming.save()
+        return incoming
+
+    def archive(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                "archive_correspondence", before="2015-01-01", stdout=StringIO()
+            )
+
+    def test_moves_old_records_and_documents_to_the_archive(self):
+        self.archive()
+
+        self.assertEqual(list(Incoming.objects.all()), [self.new])
+        archived = ArchivedIncoming.objects.get()
+        self.assertEqual(
+            (archived.pk, archived.slug, archived.subject),
+            (self.old.pk, self.old.slug, self.old.subject),
+        )
+        self.assertEqual(archived.comments.get().comment, "Filed.")
+        self.assertEqual(archived.document_text, "Old letter about culverts")
+        # The active copy goes once the blob's grace period is over.
+        with override_settings(BLOB_DELETE_GRACE=0):
+            tasks.delete_unreferenced_blob(self.old.file.name)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.media_root, self.old.file.name))
+        )
+        with archive.open_document(archived) as document:
+            self.assertEqual(document.read(), b"Old letter about culverts")
+        # Archived letters still count in the register, recounted too.
+        self.assertEqual(
+            RegisterStat.objects.get(register="incoming", dimension="total").count, 2
+        )
+        call_command("rebuild_register_stats", stdout=StringIO())
+        self.assertEqual(
+            RegisterStat.objects.get(register="incoming", dimension="total").count, 2
+        )
+
+    def test_keeps_changes_made_while_documents_are_compressed(self):
+        compress_file = archive.compress_file
+
+        def compress_and_edit(name):
+            Incoming.objects.filter(pk=self.old.pk).update(subject="Edited")
+            IncomingComment.objects.create(
+                incoming=self.old, comment="Late comment.", created_by=self.user
+            )
+            return compress_file(name)
+
+        with mock.patch.object(archive, "compress_file", compress_and_edit):
+            self.archive()
+
+        archived = ArchivedIncoming.objects.get()
+        self.assertEqual(archived.subject, "Edited")
+        self.assertEqual(
+            sorted(archived.comments.values_list("comment", flat=True)),
+            ["Filed.", "Late comment."],
+        )
+
+    def test_search_includes_the_archive_only_when_asked(self):
+        self.archive()
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse("incoming-list"), {"q": "old"})
+        self.assertNotContains(response, "Old letter")
+        self.assertNotIn("archive_page", response.context)
+
+        response = self.client.get(
+            reverse("incoming-list"), {"q": "culverts", "archive": "1"}
+        )
+        self.assertEqual(
+            [ob.subject for ob in response.context["archive_page"]], ["Old letter"]
+        )
+        self.assertContains(
+            response, reverse("archived-incoming-detail", args=[self.old.slug])
+        )
+
+        response = self.client.get(
+            reverse("archived-incoming-download", args=[self.old.slug])
+        )
+        self.assertEqual(
+            b"".join(response.streaming_content), b"Old letter about culverts"
+        )
+        self.assertEqual(response["Content-Type"], "text/plain")
+
+
+class IncomingAlertsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="registry", email="registry@example.com", is_creator=True
+        )
+
+    def create_incoming(self, subject, **kwargs):
+        return Incoming.objects.create(
+            created_by=self.user,
+            updated_by=self.user,
+            r_from="Ministry of Finance",
+            dated=datetime.date(2024, 1, 1),
+            subject=subject,
+            file="incoming/letter.pdf",
+            **kwargs,
+        )
+
+    def test_polling_finds_new_urgent_letters(self):
+        state = {}
+        self.assertEqual(alerts.poll_once(state), [])
+        self.create_incoming("Routine")
+        self.assertEqual(alerts.poll_once(state), [])
+        self.create_incoming("Flooding", urgent=True)
+        self.assertEqual(
+            [alert["subject"] for alert in alerts.poll_once(state)], ["Flooding"]
+        )
+        # Nothing changed since.
+        with self.assertNumQueries(1):
+            self.assertEqual(alerts.poll_once(state), [])
+
+    def test_confidential_alerts_reach_allowed_users_only(self):
+        other = User.objects.create(username="other", email="other@example.com")
+        alert = alerts.alert_payload(self.create_incoming("Secret", conf=True))
+        self.assertTrue(alerts.can_see(self.user, alert))
+        self.assertFalse(alerts.can_see(other, alert))
+        other.is_manager = True
+        self.assertTrue(alerts.can_see(other, alert))
+
+        event = alerts.sse_event(alert)
+        self.assertTrue(event.startswith("id: "))
+        self.assertIn("event: incoming\n", event)
+        self.assertNotIn("created_by_id", event)
+
+    async def test_broker_fans_out_to_every_subscriber(self):
+        broker = alerts.Broker()
+        first, second = broker.subscribe(), broker.subscribe()
+        broker.publish({"id": 1})
+        self.assertEqual(first.get_nowait(), {"id": 1})
+        self.assertEqual(second.get_nowait(), {"id": 1})
+        broker.unsubscribe(second)
+        broker.publish({"id": 2})
+        self.assertTrue(second.empty())
+
+    def test_django_view_tells_clients_to_stop(self):
+        # Only reached without cf.asgi in front, e.g. under runserver.
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("incoming-alerts"))
+        self.assertEqual(response.status_code, 204)
+
+    async def call_alerts_application(self, cookies=""):
+        messages = []
+        received_body = asyncio.Event()
+
+        async def receive():
+            await received_body.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+            if message["type"] == "http.response.body":
+                received_body.set()
+
+        async def django_application(scope, receive, send):
+            raise AssertionError("Not served by Django.")
+
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": reverse("incoming-alerts"),
+            "headers": [(b"cookie", cookies.encode())],
+        }
+        application = alerts.AlertsApplication(django_application)
+        await asyncio.wait_for(application(scope, receive, send), 5)
+        return messages
+
+    async def test_alerts_application_streams_to_creators(self):
+        messages = await self.call_alerts_application()
+        self.assertEqual(messages[0]["status"], 403)
+
+        await sync_to_async(self.client.force_login)(self.user)
+        cookie = self.client.cookies[settings.SESSION_COOKIE_NAME]
+        messages = await self.call_alerts_application(f"{cookie.key}={cookie.value}")
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertIn((b"content-type", b"text/event-stream"), messages[0]["headers"])
+        self.assertEqual(messages[1]["body"], b"retry: 5000\n\n")
+        self.assertFalse(alerts.broker.subscribers)
+
+
+class AddCommentTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(
+            username="registry", email="registry@example.com", is_creator=True
+        )
+        self.incoming = Incoming.objects.create(
+            created_by=self.user,
+            updated_by=self.user,
+            r_from="Ministry of Finance",
+            dated=datetime.date(2024, 1, 1),
+            subject="Letter",
+            file="incoming/letter.pdf",
+        )
+        self.url = reverse("incoming-add-comment", args=[self.incoming.slug])
+        self.client.force_login(self.user)
+
+    def test_fragment(self):
+        response = self.client.post(
+            self.url,
+            {"comment": "A **comment**"},
+            headers={"X-Requested-With": "XMLHttpRequest"},
+        )
+        self.assertEqual(response.status_code, 201)
+        comment = self.incoming.comments.get()
+        self.assertEqual(comment.created_by, self.user)
+        self.assertContains(
+            response, f'id="comment-{comment.pk}"', status_code=201
+        )
+        self.assertContains(response, "<strong>comment</strong>", status_code=201)
+        self.assertNotContains(response, "<html", status_code=201)
+
+    def test_fragment_errors_return_the_form(self):
+        response = self.client.post(
+            self.url, {"comment": ""}, headers={"X-Requested-With": "XMLHttpRequest"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertTemplateUsed(response, "posts/comment_form.html")
+        self.assertTemplateNotUsed(response, "posts/incoming_detail.html")
+        self.assertFalse(self.incoming.comments.exists())
+
+    def test_json(self):
+        headers = {"Accept": "application/json"}
+        response = self.client.post(self.url, {"comment": ""}, headers=headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("comment", response.json()["errors"])
+
+        response = self.client.post(self.url, {"comment": "Seen"}, headers=headers)
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data["id"], self.incoming.comments.get().pk)
+        self.assertIn("Seen", data["html"])
+
+    def test_without_javascript(self):
+        response = self.client.post(self.url, {"comment": "Seen"})
+        self.assertRedirects(response, self.incoming.get_absolute_url())
+        response = self.client.post(self.url, {"comment": ""})
+        self.assertEqual(response.status_code, 400)
+        self.assertTemplateUsed(response, "posts/incoming_detail.html")
+        self.assertContains(response, "This field is required.", status_code=400)
+        self.assertTrue(response.context["comments_form"].is_bound)
+
+    def test_creators_only(self):
+        self.client.force_login(
+            User.objects.create(username="reader", email="reader@example.com")
+        )
+        response = self.client.post(self.url, {"comment": "Seen"})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
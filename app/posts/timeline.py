@@ -0,0 +1,171 @@
+"""
+One chronological register of incoming and outgoing correspondence.
+
+Both tables are read as narrow projections of the same columns and merged
+with UNION ALL, newest first on ``(dated, kind, id)``. A page never reads
+more than ``per_page + 1`` rows from each table: every branch seeks past
+the cursor and stops at the limit on its own ``(dated, id)`` index, and
+the database merges the two short branches.
+"""
+
+from django.db import connections, models
+from django.db.models import F, Q, Value
+from django.http import Http404
+from django.utils.dateparse import parse_date
+
+from .models import Incoming, Outgoing
+from .pagination import KeysetPage, decode_cursor, encode_cursor
+
+INCOMING = "incoming"
+OUTGOING = "outgoing"
+
+# kind: (model, correspondent field)
+KINDS = {
+    INCOMING: (Incoming, "r_from"),
+    OUTGOING: (Outgoing, "add_to"),
+}
+
+COLUMNS = ["dated", "kind", "id", "slug", "subject", "correspondent", "urgent", "conf"]
+
+
+class TimelineEntry:
+    date_field = models.DateField()
+
+    def __init__(self, dated, kind, id, slug, subject, correspondent, urgent, conf):
+        # Raw rows skip the model converters: SQLite hands back strings and
+        # integers for dates and booleans.
+        self.dated = self.date_field.to_python(dated)
+        self.kind = kind
+        self.id = id
+        self.slug = slug
+        self.subject = subject
+        self.correspondent = correspondent
+        self.urgent = bool(urgent)
+        self.conf = bool(conf)
+
+    @property
+    def position(self):
+        return [self.dated, self.kind, self.id]
+
+    def get_absolute_url(self):
+        # Outgoing records have no page of their own yet.
+        if self.kind == INCOMING:
+            return Incoming(slug=self.slug).get_absolute_url()
+        return None
+
+    def as_json(self):
+        return {
+            "kind": self.kind,
+            "id": self.id,
+            "dated": self.dated.isoformat(),
+            "subject": self.subject,
+            "correspondent": self.correspondent,
+            "urgent": self.urgent,
+            "conf": self.conf,
+            "url": self.get_absolute_url(),
+        }
+
+
+def branch(kind, position, forward, limit, filters):
+    """The rows of one table that come after ``position``, in page order."""
+    model, correspondent_field = KINDS[kind]
+    queryset = (
+        model.objects.filter(**filters)
+        .annotate(
+            kind=Value(kind, output_field=models.CharField()),
+            correspondent=F(correspondent_field),
+        )
+        .values(*COLUMNS)
+    )
+    if position is not None:
+        # kind is a constant within a branch, so the seek on (dated, kind,
+        # id) comes down to a plain range on (dated, id). Newest first:
+        # moving forward goes back in time.
+        dated, cursor_kind, pk = position
+        op = "lt" if forward else "gt"
+        if kind == cursor_kind:
+            seek = Q(**{f"dated__{op}": dated}) | Q(dated=dated, **{f"id__{op}": pk})
+        elif (kind < cursor_kind) == forward:
+            # This kind sorts past the cursor's, so its whole day is in.
+            seek = Q(**{f"dated__{op}e": dated})
+        else:
+            seek = Q(**{f"dated__{op}": dated})
+        queryset = queryset.filter(seek)
+    ordering = ["-dated", "-id"] if forward else ["dated", "id"]
+    return queryset.order_by(*ordering)[:limit]
+
+
+class TimelinePaginator:
+    """
+    Keyset pagination over the merged registers, with the same cursors and
+    pages as KeysetPaginator.
+    """
+
+    def __init__(self, per_page, kinds=tuple(KINDS), filters=None, using="default"):
+        self.per_page = per_page
+        self.kinds = [kind for kind in KINDS if kind in kinds]
+        self.filters = filters or {}
+        self.using = using
+
+    def decode(self, cursor):
+        direction, values = decode_cursor(cursor)
+        try:
+            dated, kind, pk = values
+            dated = parse_date(dated)
+            pk = int(pk)
+        except (ValueError, TypeError, OverflowError):
+            raise Http404("Invalid cursor.")
+        # A tampered kind could be anything JSON holds, like a list.
+        if dated is None or not isinstance(kind, str) or kind not in KINDS:
+            raise Http404("Invalid cursor.")
+        return direction, [dated, kind, pk]
+
+    def fetch(self, position, forward):
+        limit = self.per_page + 1
+        connection = connections[self.using]
+        quote = connection.ops.quote_name
+        columns = ", ".join(quote(column) for column in COLUMNS)
+        parts, params = [], []
+        for kind in self.kinds:
+            sql, branch_params = (
+                branch(kind, position, forward, limit, self.filters)
+                .query.get_compiler(using=self.using)
+                .as_sql()
+            )
+            # Wrapped so each branch keeps its own ORDER BY and LIMIT.
+            parts.append(f"SELECT {columns} FROM ({sql}) {quote(kind)}")
+            params.extend(branch_params)
+        if not parts:
+            return []
+        direction = "DESC" if forward else "ASC"
+        ordering = ", ".join(
+            f"{quote(column)} {direction}" for column in ("dated", "kind", "id")
+        )
+        sql = f"{' UNION ALL '.join(parts)} ORDER BY {ordering} LIMIT %s"
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, limit])
+            return [TimelineEntry(*row) for row in cursor.fetchall()]
+
+    def page(self, cursor=None):
+        direction, position = self.decode(cursor) if cursor else ("next", None)
+        forward = direction == "next"
+
+        rows = self.fetch(position, forward)
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if not forward:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage([], None, None)
+
+        if forward:
+            has_next, has_previous = has_more, position is not None
+        else:
+            has_next, has_previous = True, has_more
+
+        return KeysetPage(
+            rows,
+            encode_cursor(rows[-1].position, "next") if has_next else None,
+            encode_cursor(rows[0].position, "prev") if has_previous else None,
+        )
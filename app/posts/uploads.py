@@ -0,0 +1,122 @@
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+
+READ_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    pass
+
+
+class AssembledFile(File):
+    """
+    A finished chunked upload on local disk.
+
+    FileSystemStorage moves files exposing ``temporary_file_path`` into
+    place instead of copying their content, so attaching is a rename.
+    """
+
+    def __init__(self, path, size, sha256=None):
+        super().__init__(None, os.path.basename(path))
+        self.path = path
+        self._size = size
+        # Read by ContentAddressedStorage, which hashes the file otherwise.
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.path
+
+    def open(self, mode="rb"):
+        self.file = open(self.path, mode)
+        return self
+
+    @property
+    def size(self):
+        return self._size
+
+
+# Whole-file SHA-256 of the uploads whose chunks all came through this
+# process so far, by uid: (bytes hashed, hash). hashlib state cannot be
+# stored, so an upload whose chunks were spread over several processes is
+# hashed once more when it is attached.
+_running_hashes = {}
+
+
+def running_hash(upload):
+    """The SHA-256 of ``upload`` up to its offset, if this process has it."""
+    if upload.offset == 0:
+        return hashlib.sha256()
+    hashed, digest = _running_hashes.get(upload.uid, (None, None))
+    return digest.copy() if hashed == upload.offset else None
+
+
+def pop_file_hash(upload):
+    """The hex SHA-256 of a complete upload, if this process hashed it all."""
+    hashed, digest = _running_hashes.pop(upload.uid, (None, None))
+    return digest.hexdigest() if hashed == upload.size else None
+
+
+def part_path(uid):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f"{uid}.part")
+
+
+def create_part(uid):
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(part_path(uid), "wb").close()
+
+
+def remove_part(uid):
+    _running_hashes.pop(uid, None)
+    try:
+        os.remove(part_path(uid))
+    except FileNotFoundError:
+        pass
+
+
+def expected_chunk_length(upload):
+    return min(upload.chunk_size, upload.size - upload.offset)
+
+
+def write_chunk(upload, stream, checksum):
+    """
+    Append the chunk read from ``stream`` at ``upload.offset``.
+
+    The chunk is hashed while it is written, and so is the whole file when
+    this process has its hash so far; on a length or SHA-256 mismatch the
+    part file is truncated back so the client can resend. Returns the number
+    of bytes written.
+    """
+    expected = expected_chunk_length(upload)
+    digest = hashlib.sha256()
+    file_digest = running_hash(upload)
+    written = 0
+    with open(upload.part_path, "r+b") as part:
+        part.seek(upload.offset)
+        # Read one byte past the expected length to detect oversized chunks.
+        while written <= expected:
+            data = stream.read(min(READ_SIZE, expected + 1 - written))
+            if not data:
+                break
+            digest.update(data)
+            if file_digest is not None:
+                file_digest.update(data)
+            part.write(data)
+            written += len(data)
+
+        error = None
+        if written != expected:
+            error = f"Expected {expected} bytes, received {written}."
+        elif digest.hexdigest() != checksum.lower():
+            error = "Checksum mismatch."
+        if error:
+            part.truncate(upload.offset)
+            raise ChunkError(error)
+        part.truncate(upload.offset + written)
+    if file_digest is not None:
+        _running_hashes[upload.uid] = (upload.offset + written, file_digest)
+    else:
+        _running_hashes.pop(upload.uid, None)
+    return written
@@ -4,11 +4,32 @@ from . import views
 
 urlpatterns = [
     path("list/", views.IncomingListView.as_view(), name="incoming-list"),
+    path("list/export/", views.IncomingExportView.as_view(), name="incoming-export"),
     path(
         "incoming/detail/<slug:slug>/",
         views.IncomingDetailView.as_view(),
         name="incoming-detail",
     ),
+    path(
+        "incoming/download/<slug:slug>/",
+        views.IncomingDownloadView.as_view(),
+        name="incoming-download",
+    ),
+    path(
+        "incoming/preview/<slug:slug>/<str:kind>/",
+        views.IncomingPreviewView.as_view(),
+        name="incoming-preview",
+    ),
+    path(
+        "archive/<slug:slug>/",
+        views.ArchivedIncomingDetailView.as_view(),
+        name="archived-incoming-detail",
+    ),
+    path(
+        "archive/download/<slug:slug>/",
+        views.ArchivedIncomingDownloadView.as_view(),
+        name="archived-incoming-download",
+    ),
     path(
         "incoming//update<slug:slug>/",
         views.IncomingUpdateView.as_view(),
@@ -17,6 +38,15 @@ urlpatterns = [
     path(
         "", views.IncomingCreateView.as_view(), name="incoming-create"
     ),
+    path("timeline/", views.TimelineView.as_view(), name="timeline"),
+    path("api/timeline/", views.TimelineApiView.as_view(), name="timeline-api"),
+    path("alerts/", views.incoming_alerts_view, name="incoming-alerts"),
+    path("stats/", views.StatsDashboardView.as_view(), name="stats-dashboard"),
+    path("uploads/", views.upload_create_view, name="upload-create"),
+    path("uploads/<uuid:uid>/", views.upload_status_view, name="upload-status"),
+    path(
+        "uploads/<uuid:uid>/chunk/", views.upload_chunk_view, name="upload-chunk"
+    ),
     path(
         "incoming-comment/<slug:slug>/",
         views.add_comment_view,
@@ -0,0 +1,111 @@
+"""
+Versions of the register pages, the cheap validators of their ETags.
+
+Every change to what the pages show bumps a version: saved and deleted
+letters, rendered previews and extracted text (INCOMING), and the names and
+roles of people shown on them (USERS). A version is spread over SHARDS
+rows and each bump updates one picked at random, so concurrent writes rarely
+wait on each other. The version is the sum of its shards, which only grows.
+"""
+
+import random
+
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+INCOMING = "incoming"
+USERS = "users"
+
+SHARDS = 16
+
+# The User fields the register pages and their navigation display.
+DISPLAYED_USER_FIELDS = {
+    "first_name",
+    "last_name",
+    "email",
+    "slug",
+    "is_superuser",
+    "is_manager",
+    "is_admin",
+}
+
+
+def shard_names(name):
+    # The first shard keeps the plain name, the row versions were kept in
+    # before they were sharded, so sums continue from its count.
+    return [name, *(f"{name}:{shard}" for shard in range(1, SHARDS))]
+
+
+def bump(name):
+    """Record that something shown on the ``name`` pages changed."""
+    from .models import RegisterVersion
+
+    now = timezone.now()
+    shard = random.choice(shard_names(name))
+    updated = RegisterVersion.objects.filter(name=shard).update(
+        version=F("version") + 1, changed_at=now
+    )
+    if not updated:
+        _, created = RegisterVersion.objects.get_or_create(
+            name=shard, defaults={"version": 1, "changed_at": now}
+        )
+        if not created:
+            RegisterVersion.objects.filter(name=shard).update(
+                version=F("version") + 1, changed_at=now
+            )
+
+
+def current(*names):
+    """
+    Return ``(versions, changed_at)``: the version of each of ``names``, and
+    when the last of them changed.
+    """
+    from .models import RegisterVersion
+
+    totals = dict.fromkeys(names, 0)
+    changed_at = None
+    shards = {shard: name for name in names for shard in shard_names(name)}
+    for shard, version, changed in RegisterVersion.objects.filter(
+        name__in=shards
+    ).values_list("name", "version", "changed_at"):
+        totals[shards[shard]] += version
+        changed_at = changed if changed_at is None else max(changed_at, changed)
+    return [totals[name] for name in names], changed_at
+
+
+def bump_incoming(sender, **kwargs):
+    bump(INCOMING)
+
+
+def displayed_user(user):
+    return {field: getattr(user, field) for field in DISPLAYED_USER_FIELDS}
+
+
+def remember_user(sender, instance, **kwargs):
+    # Deferred fields are left alone: what was displayed is unknown.
+    if instance.pk is None or DISPLAYED_USER_FIELDS - instance.__dict__.keys():
+        instance._displayed = None
+    else:
+        instance._displayed = displayed_user(instance)
+
+
+def bump_users_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields and not DISPLAYED_USER_FIELDS & set(update_fields):
+        # Like logging in, which only saves last_login.
+        return
+    displayed = displayed_user(instance)
+    # A new account is on no page yet.
+    if not created and getattr(instance, "_displayed", None) != displayed:
+        bump(USERS)
+    instance._displayed = displayed
+
+
+def bump_users_delete(sender, **kwargs):
+    bump(USERS)
+
+
+def connect_users(model):
+    post_init.connect(remember_user, sender=model)
+    post_save.connect(bump_users_save, sender=model)
+    post_delete.connect(bump_users_delete, sender=model)
@@ -1,67 +1,397 @@
+import json
+import mimetypes
+import os
 from urllib.parse import urlencode
 
+from cf.routers import ReplicaReadMixin
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q
+from django.core.exceptions import PermissionDenied
+from django.db import router, transaction
+from django.db.models import Count, Max, OuterRef, Prefetch, Subquery
+from django.db.models.fields.files import FieldFile
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    JsonResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.generic import CreateView, DetailView, ListView, UpdateView
-from users.user_permissions import CreatorAccessMixin
+from django.template.loader import render_to_string
+from django.views.decorators.http import require_GET, require_POST
+from django.utils.dateparse import parse_date
+from django.views.generic import (
+    CreateView,
+    DetailView,
+    ListView,
+    TemplateView,
+    UpdateView,
+    View,
+)
+from users.user_permissions import CreatorAccessMixin, ManagerAccessMixin
 
+from . import archive, previews, search, stats, timeline, uploads, versions
+from .conditional import ConditionalGetMixin
+from .downloads import serve_file
+from .exports import EXPORT_FORMATS, INCOMING_EXPORT_FIELDS, export_response
 from .forms import IncomingCommentForm, IncomingForm
-from .models import Incoming, IncomingComment, Outgoing, OutgoingComment
+from .models import (
+    ArchivedIncoming,
+    Blob,
+    ChunkedUpload,
+    Incoming,
+    IncomingComment,
+    Outgoing,
+    OutgoingComment,
+    RegisterStat,
+)
+from .pagination import KeysetPaginationMixin, KeysetPaginator
 
 
-class IncomingListView(CreatorAccessMixin, ListView):
-    model = Incoming
-    paginate_by = 25
+def with_preview_status(queryset):
+    return queryset.annotate(
+        preview_status=Subquery(
+            Blob.objects.filter(name=OuterRef("file")).values("preview_status")[:1]
+        )
+    )
+
+
+def date_param(request, name):
+    """The date in query parameter ``name``, None if missing or invalid."""
+    try:
+        return parse_date(request.GET.get(name) or "")
+    except ValueError:
+        # Well formed but impossible, like 2024-02-30.
+        return None
 
-    def get_queryset(self):
-        queryset = super().get_queryset()
 
+class IncomingFilterMixin:
+    """The register filters shared by the list and its export."""
+
+    def filter_queryset(self, queryset, search_function=search.search_incoming):
         # Retrieve and apply filter parameters
         query = self.request.GET.get("q")
         urgent = self.request.GET.get("urgent")
         conf = self.request.GET.get("conf")
+        date_from = date_param(self.request, "date_from")
+        date_to = date_param(self.request, "date_to")
 
         if query:
-            queryset = queryset.filter(
-                Q(note__icontains=query)
-                | Q(r_from__icontains=query)
-                | Q(sender__icontains=query)
-                | Q(subject__icontains=query)
-                | Q(phone__icontains=query)
-                | Q(phone__icontains=query)
-            )
+            queryset = search_function(queryset, query)
         if urgent == "1":
             queryset = queryset.filter(urgent=True)
 
         if conf == "1":
             queryset = queryset.filter(conf=True)
-    
+
+        if date_from:
+            queryset = queryset.filter(dated__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(dated__lte=date_to)
+
         return queryset
 
+
+class IncomingListView(
+    CreatorAccessMixin,
+    ReplicaReadMixin,
+    ConditionalGetMixin,
+    IncomingFilterMixin,
+    KeysetPaginationMixin,
+    ListView,
+):
+    model = Incoming
+    paginate_by = 25
+    keyset_ordering = ["-dated", "-id"]
+
+    def get_validators(self):
+        # Any change to the register bumps its version, the filters and
+        # cursor are covered by the query string in the ETag.
+        return versions.current(versions.INCOMING, versions.USERS)
+
+    def get_queryset(self):
+        return with_preview_status(self.filter_queryset(super().get_queryset()))
+
+    def get_archive_page(self):
+        # Old letters only come from the archive when asked for, the active
+        # register's queries never touch it.
+        queryset = self.filter_queryset(
+            ArchivedIncoming.objects.all(), search.search_archive
+        )
+        paginator = KeysetPaginator(
+            queryset, self.paginate_by, self.get_keyset_ordering(queryset)
+        )
+        return paginator.page(self.request.GET.get("archive_cursor"))
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["comments_form"] = IncomingCommentForm
+        if self.request.GET.get("archive") == "1":
+            context["archive_page"] = self.get_archive_page()
 
         # Preserve query parameters for pagination
         query_params = self.request.GET.copy()
-        if "page" in query_params:
-            query_params.pop(
-                "page"
-            )  # Remove 'page' from query parameters to prevent duplication
+        for param in ("page", self.cursor_kwarg, "archive_cursor"):
+            if param in query_params:
+                query_params.pop(
+                    param
+                )  # Remove the position from query parameters to prevent duplication
         context["query_params"] = urlencode(query_params)
 
         return context
 
 
-class IncomingDetailView(CreatorAccessMixin, DetailView):
+class IncomingExportView(
+    CreatorAccessMixin, ReplicaReadMixin, IncomingFilterMixin, View
+):
+    def get(self, request, *args, **kwargs):
+        export_format = request.GET.get("format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            raise Http404("Unknown export format.")
+        queryset = self.filter_queryset(Incoming.objects.all())
+        if not queryset.query.order_by:
+            queryset = queryset.order_by("-dated", "-id")
+        # The rows stream after dispatch returns, fix the database now.
+        queryset = queryset.using(queryset.db)
+        return export_response(
+            queryset, INCOMING_EXPORT_FIELDS, "incoming-register", export_format
+        )
+
+
+class StatsDashboardView(ManagerAccessMixin, TemplateView):
+    template_name = "posts/stats_dashboard.html"
+    months_shown = 24
+    correspondents_shown = 10
+
+    def get_register_stats(self, register):
+        # Reads only the summary rows: a few totals, the months shown and
+        # the top correspondents, whatever the size of the register.
+        rows = RegisterStat.objects.filter(register=register)
+        totals = dict(
+            rows.filter(
+                dimension__in=[stats.TOTAL, stats.URGENT, stats.CONF]
+            ).values_list("dimension", "count")
+        )
+        months = list(
+            rows.filter(dimension=stats.MONTH, count__gt=0)
+            .order_by("-key")
+            .values_list("key", "count")[: self.months_shown]
+        )
+        correspondents = list(
+            rows.filter(dimension=stats.CORRESPONDENT, count__gt=0)
+            .order_by("-count", "key")
+            .values_list("key", "count")[: self.correspondents_shown]
+        )
+        busiest = max([count for _, count in months], default=0)
+        return {
+            "name": register,
+            "total": totals.get(stats.TOTAL, 0),
+            "urgent": totals.get(stats.URGENT, 0),
+            "conf": totals.get(stats.CONF, 0),
+            "months": [
+                (month, count, round(count * 100 / busiest) if busiest else 0)
+                for month, count in reversed(months)
+            ],
+            "correspondents": correspondents,
+        }
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["registers"] = [
+            self.get_register_stats(register) for register in stats.REGISTERS
+        ]
+        return context
+
+
+class TimelineMixin:
+    """The timeline page in use, filtered by kind, urgent, conf and date."""
+
+    paginate_by = 25
+
+    def get_timeline_page(self):
+        kind = self.request.GET.get("kind")
+        filters = {}
+        if self.request.GET.get("urgent") == "1":
+            filters["urgent"] = True
+        if self.request.GET.get("conf") == "1":
+            filters["conf"] = True
+        date_from = date_param(self.request, "date_from")
+        date_to = date_param(self.request, "date_to")
+        if date_from:
+            filters["dated__gte"] = date_from
+        if date_to:
+            filters["dated__lte"] = date_to
+        paginator = timeline.TimelinePaginator(
+            self.paginate_by,
+            kinds=[kind] if kind in timeline.KINDS else timeline.KINDS,
+            filters=filters,
+            using=router.db_for_read(Incoming),
+        )
+        return paginator.page(self.request.GET.get("cursor"))
+
+
+class TimelineView(
+    CreatorAccessMixin, ReplicaReadMixin, TimelineMixin, TemplateView
+):
+    template_name = "posts/timeline.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = self.get_timeline_page()
+        query_params = self.request.GET.copy()
+        query_params.pop("cursor", None)
+        context.update(
+            {
+                "page_obj": page,
+                "object_list": page.object_list,
+                "is_paginated": page.has_other_pages(),
+                "query_params": urlencode(query_params),
+            }
+        )
+        return context
+
+
+class TimelineApiView(CreatorAccessMixin, ReplicaReadMixin, TimelineMixin, View):
+    def get(self, request, *args, **kwargs):
+        page = self.get_timeline_page()
+        return JsonResponse(
+            {
+                "results": [entry.as_json() for entry in page],
+                "next": page.next_cursor,
+                "previous": page.previous_cursor,
+            }
+        )
+
+
+class IncomingDetailView(
+    CreatorAccessMixin, ReplicaReadMixin, ConditionalGetMixin, DetailView
+):
     model = Incoming
 
+    def get_validators(self):
+        row = (
+            with_preview_status(Incoming.objects.filter(slug=self.kwargs["slug"]))
+            .annotate(
+                last_comment_at=Max("comments__updated_at"),
+                comment_count=Count("comments"),
+            )
+            .values_list(
+                "updated_at", "last_comment_at", "comment_count", "preview_status"
+            )
+            .first()
+        )
+        if row is None:
+            raise Http404("No incoming found matching the query")
+        updated_at, last_comment_at, _, _ = row
+        parts, changed_at = versions.current(versions.USERS)
+        changes = filter(None, [updated_at, last_comment_at, changed_at])
+        return [*row, *parts], max(changes)
+
+    def get_queryset(self):
+        # Load the object, its author and every comment with its author up
+        # front so the page costs the same number of queries at any size.
+        return (
+            with_preview_status(super().get_queryset())
+            .select_related("created_by")
+            .prefetch_related(
+                Prefetch(
+                    "comments",
+                    queryset=IncomingComment.objects.select_related("created_by"),
+                )
+            )
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.setdefault("comments_form", IncomingCommentForm())
+        context["can_view_document"] = self.object.can_be_viewed_by(
+            self.request.user
+        )
+        return context
+
+
+class IncomingDownloadView(CreatorAccessMixin, DetailView):
+    model = Incoming
+
+    def get(self, request, *args, **kwargs):
+        incoming = self.get_object()
+        if not incoming.file:
+            raise Http404("No document attached.")
+        if not incoming.can_be_viewed_by(request.user):
+            raise PermissionDenied
+        return serve_file(request, incoming.file, incoming.document_filename)
+
+
+class IncomingPreviewView(CreatorAccessMixin, DetailView):
+    model = Incoming
+
+    def get(self, request, *args, **kwargs):
+        incoming = self.get_object()
+        kind = kwargs["kind"]
+        if kind not in previews.PREVIEW_KINDS or not incoming.file:
+            raise Http404("No preview.")
+        if not incoming.can_be_viewed_by(request.user):
+            raise PermissionDenied
+        name = previews.preview_name(incoming.file.name, kind)
+        if not incoming.file.storage.exists(name):
+            raise Http404("The preview has not been rendered.")
+        response = serve_file(
+            request,
+            FieldFile(incoming, incoming.file.field, name),
+            f"{os.path.splitext(incoming.document_filename)[0]}.{kind}.png",
+        )
+        # Previews are named after the document's content and never change.
+        response["Cache-Control"] = "private, max-age=86400"
+        return response
+
+
+class ArchivedIncomingDetailView(CreatorAccessMixin, ReplicaReadMixin, DetailView):
+    model = ArchivedIncoming
+
+    def get_queryset(self):
+        return (
+            super()
+            .get_queryset()
+            .select_related("created_by")
+            .prefetch_related("comments__created_by")
+        )
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["can_view_document"] = self.object.can_be_viewed_by(
+            self.request.user
+        )
+        return context
+
+
+class ArchivedIncomingDownloadView(CreatorAccessMixin, DetailView):
+    model = ArchivedIncoming
+
+    def get(self, request, *args, **kwargs):
+        archived = self.get_object()
+        if not archived.archive_file:
+            raise Http404("No document archived.")
+        if not archived.can_be_viewed_by(request.user):
+            raise PermissionDenied
+        filename = archived.document_filename
+        content_type, _ = mimetypes.guess_type(filename)
+        return FileResponse(
+            archive.open_document(archived),
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type or "application/octet-stream",
+        )
+
 
 class IncomingUpdateView(CreatorAccessMixin, UpdateView):
     model = Incoming
     form_class = IncomingForm
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["user"] = self.request.user
+        return kwargs
+
     def form_valid(self, form):
         form.instance.updated_by = self.request.user
         return super().form_valid(form)
@@ -71,29 +401,145 @@ class IncomingCreateView(CreatorAccessMixin, CreateView):
     model = Incoming
     form_class = IncomingForm
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["user"] = self.request.user
+        return kwargs
+
     def form_valid(self, form):
         form.instance.created_by = self.request.user
         form.instance.updated_by = self.request.user
         return super().form_valid(form)
 
 
-def add_comment_view(request, slug):
-    incoming = get_object_or_404(Incoming, slug=slug)
-
-    if request.method == "POST":
-        form = IncomingCommentForm(request.POST)
-        if form.is_valid():
-            comment = form.save(commit=False)
-            comment.incoming = incoming
-            if request.user.is_authenticated:
-                comment.created_by = request.user
-                comment.updated_by = request.user
-            comment.save()
-            return redirect("incoming-detail", slug=slug)
-
-    # If the form is not valid or the request method is not POST
-    return render(
-        request,
-        "incoming/incoming_detail.html",
-        {"incoming": incoming, "comment_form": form},
+def upload_json(upload):
+    return {
+        "id": str(upload.uid),
+        "filename": upload.filename,
+        "size": upload.size,
+        "chunk_size": upload.chunk_size,
+        "offset": upload.offset,
+        "complete": upload.is_complete,
+    }
+
+
+@login_required
+@require_POST
+def upload_create_view(request):
+    if not request.user.is_creator:
+        raise PermissionDenied
+    try:
+        data = json.loads(request.body)
+        filename = str(data["filename"])[:255]
+        size = int(data["size"])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "filename and size are required."}, status=400)
+    if not 0 < size <= settings.CHUNKED_UPLOAD_MAX_SIZE:
+        return JsonResponse({"error": "File is too large."}, status=400)
+
+    upload = ChunkedUpload.objects.create(
+        created_by=request.user,
+        filename=filename,
+        size=size,
+        chunk_size=settings.CHUNKED_UPLOAD_CHUNK_SIZE,
     )
+    uploads.create_part(upload.uid)
+    return JsonResponse(upload_json(upload), status=201)
+
+
+@login_required
+@require_GET
+def upload_status_view(request, uid):
+    upload = get_object_or_404(ChunkedUpload, uid=uid, created_by=request.user)
+    return JsonResponse(upload_json(upload))
+
+
+@login_required
+@require_POST
+def upload_chunk_view(request, uid):
+    with transaction.atomic():
+        upload = get_object_or_404(
+            ChunkedUpload.objects.select_for_update(),
+            uid=uid,
+            created_by=request.user,
+        )
+        # Resuming clients must send the offset the server reported,
+        # anything else gets the current offset back.
+        try:
+            offset = int(request.headers.get("X-Upload-Offset", ""))
+        except ValueError:
+            offset = None
+        if upload.is_complete or offset != upload.offset:
+            return JsonResponse(upload_json(upload), status=409)
+
+        checksum = request.headers.get("X-Chunk-Checksum", "")
+        try:
+            written = uploads.write_chunk(upload, request, checksum)
+        except uploads.ChunkError as error:
+            return JsonResponse({"error": str(error), **upload_json(upload)}, status=400)
+
+        upload.offset += written
+        if upload.offset == upload.size:
+            upload.status = ChunkedUpload.COMPLETE
+        upload.save(update_fields=["offset", "status", "updated_at"])
+    return JsonResponse(upload_json(upload))
+
+
+def incoming_alerts_view(request):
+    # cf.asgi answers this URL with the live stream (posts.alerts). Reached
+    # any other way, e.g. under runserver, 204 tells EventSource clients to
+    # stop reconnecting.
+    return HttpResponse(status=204)
+
+
+def comment_response_type(request):
+    """How a comment post wants its answer: "json", "fragment" or "page"."""
+    if "application/json" in request.headers.get("Accept", ""):
+        return "json"
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        return "fragment"
+    return "page"
+
+
+@login_required
+@require_POST
+def add_comment_view(request, slug):
+    if not request.user.is_creator:
+        raise PermissionDenied
+    incoming = get_object_or_404(Incoming.objects.only("pk", "slug"), slug=slug)
+    response_type = comment_response_type(request)
+
+    form = IncomingCommentForm(request.POST)
+    if not form.is_valid():
+        # Only the form goes back, the thread on the page is left alone.
+        if response_type == "json":
+            return JsonResponse({"errors": form.errors.get_json_data()}, status=400)
+        if response_type == "fragment":
+            return render(
+                request,
+                "posts/comment_form.html",
+                {"object": incoming, "comments_form": form},
+                status=400,
+            )
+        # The page again, with the errors and what was typed. A redirect
+        # would get the unchanged page's 304 and lose both.
+        detail = IncomingDetailView()
+        detail.setup(request, slug=slug)
+        detail.object = detail.get_object()
+        return detail.render_to_response(
+            detail.get_context_data(comments_form=form), status=400
+        )
+
+    comment = form.save(commit=False)
+    comment.incoming = incoming
+    comment.created_by = request.user
+    comment.updated_by = request.user
+    comment.save()
+
+    if response_type == "page":
+        return redirect("incoming-detail", slug=slug)
+    # The new comment on its own, rendered for insertion into the thread.
+    html = render_to_string("posts/comment.html", {"comment": comment}, request)
+    if response_type == "json":
+        return JsonResponse({"id": comment.pk, "html": html}, status=201)
+    return HttpResponse(html, status=201)
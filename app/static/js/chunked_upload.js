@@ -0,0 +1,110 @@
+// Uploads the selected document in fixed-size chunks before the form is
+// submitted, so large scans resume from the last chunk after a dropped
+// connection instead of starting over. Falls back to a normal multipart
+// post when SubtleCrypto (needed for the chunk checksums) is unavailable.
+(function () {
+    const MAX_RETRIES = 5;
+
+    function hex(buffer) {
+        return Array.from(new Uint8Array(buffer))
+            .map((b) => b.toString(16).padStart(2, '0'))
+            .join('');
+    }
+
+    function sleep(ms) {
+        return new Promise((resolve) => setTimeout(resolve, ms));
+    }
+
+    async function request(url, options, csrfToken) {
+        options.headers = Object.assign({ 'X-CSRFToken': csrfToken }, options.headers);
+        options.credentials = 'same-origin';
+        const response = await fetch(url, options);
+        const data = await response.json();
+        return { response, data };
+    }
+
+    async function startUpload(baseUrl, file, csrfToken) {
+        const key = `chunked-upload:${file.name}:${file.size}:${file.lastModified}`;
+        const existing = localStorage.getItem(key);
+        if (existing) {
+            const { response, data } = await request(`${baseUrl}${existing}/`, { method: 'GET' }, csrfToken);
+            if (response.ok) {
+                return { key, upload: data };
+            }
+        }
+        const { response, data } = await request(baseUrl, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size }),
+        }, csrfToken);
+        if (!response.ok) {
+            throw new Error(data.error || 'Upload could not be started.');
+        }
+        localStorage.setItem(key, data.id);
+        return { key, upload: data };
+    }
+
+    async function uploadFile(baseUrl, file, csrfToken, progress) {
+        let { key, upload } = await startUpload(baseUrl, file, csrfToken);
+        let retries = 0;
+
+        while (!upload.complete) {
+            progress.textContent = `Uploading ${Math.floor((upload.offset / upload.size) * 100)}%`;
+            const chunk = await file.slice(upload.offset, upload.offset + upload.chunk_size).arrayBuffer();
+            const checksum = hex(await crypto.subtle.digest('SHA-256', chunk));
+            try {
+                const { response, data } = await request(`${baseUrl}${upload.id}/chunk/`, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/octet-stream',
+                        'X-Upload-Offset': String(upload.offset),
+                        'X-Chunk-Checksum': checksum,
+                    },
+                    body: chunk,
+                }, csrfToken);
+                if (!response.ok && response.status !== 409) {
+                    throw new Error(data.error || 'Chunk rejected.');
+                }
+                // 409 carries the server's offset, resume from there.
+                upload = data;
+                retries = 0;
+            } catch (error) {
+                if (++retries > MAX_RETRIES) {
+                    throw error;
+                }
+                await sleep(1000 * 2 ** retries);
+                upload = (await request(`${baseUrl}${upload.id}/`, { method: 'GET' }, csrfToken)).data;
+            }
+        }
+        localStorage.removeItem(key);
+        progress.textContent = 'Upload complete';
+        return upload.id;
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        const form = document.querySelector('form[data-upload-url]');
+        if (!form || !(window.crypto && crypto.subtle)) {
+            return;
+        }
+        const fileInput = form.querySelector('input[type="file"]');
+        const uploadId = form.querySelector('input[name="upload_id"]');
+        const progress = document.createElement('p');
+        progress.className = 'small text-muted';
+        fileInput.after(progress);
+
+        form.addEventListener('submit', async function (event) {
+            if (!fileInput.files.length || uploadId.value) {
+                return;
+            }
+            event.preventDefault();
+            const csrfToken = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+            try {
+                uploadId.value = await uploadFile(form.dataset.uploadUrl, fileInput.files[0], csrfToken, progress);
+                fileInput.value = '';
+                form.submit();
+            } catch (error) {
+                progress.textContent = `${error.message} Submit again to resume.`;
+            }
+        });
+    });
+})();
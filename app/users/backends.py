@@ -1,26 +1,102 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
 from django.db.models import Q
+from django.db.models.functions import Lower
+
 from .models import User
 
 
+def unknown_identifier_key(identifier):
+    digest = hashlib.sha256(identifier.encode()).hexdigest()
+    return f"auth:unknown:{digest}"
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def forget_users(*user_ids):
+    cache.delete_many([user_cache_key(user_id) for user_id in user_ids])
+
+
+def forget_unknown_identifiers(*identifiers):
+    cache.delete_many(
+        [
+            unknown_identifier_key(identifier.lower())
+            for identifier in identifiers
+            if identifier
+        ]
+    )
+
+
 class EmailOrUsernameBackend(ModelBackend):
+    """
+    Log in with a username or an email address, case-insensitively.
+
+    The user is found with a single query on the lower(username) and
+    lower(email) indexes and the password is hashed once. Identifiers that
+    match nobody are remembered for AUTH_UNKNOWN_IDENTIFIER_TIMEOUT seconds
+    so repeated attempts with them skip the database.
+
+    The user of every request is loaded from the cache too, with its
+    department, and dropped from it by User.save and UserQuerySet.update.
+    Both caches are only used when their timeout is set.
+    """
+
+    def get_user(self, user_id):
+        timeout = settings.AUTH_USER_CACHE_TIMEOUT
+        key = user_cache_key(user_id)
+        user = cache.get(key) if timeout else None
+        if user is None:
+            try:
+                user = User.objects.select_related("department").get(pk=user_id)
+            except User.DoesNotExist:
+                return None
+            if timeout:
+                cache.set(key, user, timeout)
+        return user if self.user_can_authenticate(user) else None
+
     def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
         if username is None or password is None:
             return None
 
         # Normalize the input for case-insensitivity
-        normalized_input = username.strip().lower()
-
-        try:
-            # Search for user by username or email (case-insensitive)
-            user = User.objects.get(
-                Q(username__iexact=normalized_input) | Q(email__iexact=normalized_input)
-            )
-        except User.DoesNotExist:
+        identifier = username.strip().lower()
+        user = self.get_user_by_identifier(identifier)
+        if user is None:
+            # Hash anyway so an unknown user takes as long as a wrong password.
+            User().set_password(password)
             return None
 
-        # Validate the password
-        if user.check_password(password):
+        if user.check_password(password) and self.user_can_authenticate(user):
             return user
+        return None
+
+    def get_user_by_identifier(self, identifier):
+        timeout = settings.AUTH_UNKNOWN_IDENTIFIER_TIMEOUT
+        key = unknown_identifier_key(identifier)
+        if timeout and cache.get(key):
+            return None
 
-        return None
\ No newline at end of file
+        users = list(
+            User.objects.order_by()
+            .alias(
+                username_lower=Lower("username"), email_lower=Lower("email")
+            )
+            .filter(Q(username_lower=identifier) | Q(email_lower=identifier))[:3]
+        )
+        # A username is unique, an email address may be shared: prefer the
+        # username and refuse to guess between accounts sharing an email.
+        for user in users:
+            if user.username.lower() == identifier:
+                return user
+        if len(users) == 1:
+            return users[0]
+        if not users and timeout:
+            cache.set(key, True, timeout)
+        return None
@@ -1,7 +1,9 @@
 import uuid
 
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as AuthUserManager
 from django.db import models
+from django.db.models.functions import Lower
 from django.shortcuts import reverse
 from django.utils.text import slugify
 
@@ -10,10 +12,32 @@ class Department(models.Model):
     name = models.CharField(max_length=255)
     slug = models.SlugField(max_length=255, unique=True, blank=True, null=True)
 
+    def save(self, *args, **kwargs):
+        from .backends import forget_users
+
+        super().save(*args, **kwargs)
+        # Cached users carry their department.
+        if self.pk:
+            forget_users(*self.user_set.values_list("pk", flat=True))
+
     def __str__(self):
         return self.name
 
 
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        from .backends import forget_users
+
+        user_ids = list(self.values_list("pk", flat=True))
+        result = super().update(**kwargs)
+        forget_users(*user_ids)
+        return result
+
+
+class UserManager(AuthUserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     is_creator = models.BooleanField(default=False)
     is_manager = models.BooleanField(default=False)
@@ -25,15 +49,35 @@ class User(AbstractUser):
     phone = models.CharField(max_length=7, null=True, blank=True)
     slug = models.SlugField(unique=True, blank=True, null=True)
 
+    objects = UserManager()
+
     class Meta:
         ordering = ["username"]
+        indexes = [
+            # Case-insensitive login lookups, see EmailOrUsernameBackend.
+            models.Index(Lower("username"), name="users_user_username_lower_idx"),
+            models.Index(Lower("email"), name="users_user_email_lower_idx"),
+        ]
 
     def save(self, *args, **kwargs):
+        from .backends import forget_unknown_identifiers, forget_users
+
         if not self.slug:
             self.slug = slugify(self.uid)
         self.email = self.email.lower()
         self.username = self.username.lower()
         super(User, self).save(*args, **kwargs)
+        forget_users(self.pk)
+        # A new or renamed account may match a cached unknown identifier.
+        forget_unknown_identifiers(self.username, self.email)
+
+    def delete(self, *args, **kwargs):
+        from .backends import forget_users
+
+        user_id = self.pk
+        result = super().delete(*args, **kwargs)
+        forget_users(user_id)
+        return result
 
     def get_absolute_url(self):
         return reverse("get-user-detail", kwargs={"slug": self.slug})
@@ -1,5 +1,4 @@
 from django.conf import settings
-from django.contrib import messages
 from django.contrib.sites.models import Site
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
@@ -7,11 +6,14 @@ from django.urls import reverse
 from django.utils.encoding import force_bytes
 from django.utils.html import strip_tags
 from django.utils.http import urlsafe_base64_encode
+from jobs.queue import get_mail_connection, task
 
+from .models import User
 from .tokens import account_activation_token
 
 
-def forgot_password_email(email, user, reset_link, message, subject):
+@task
+def forgot_password_email(email, subject, message):
     send_mail(
         subject,  # subject of email
         message,  # body of email
@@ -19,10 +21,13 @@ def forgot_password_email(email, user, reset_link, message, subject):
         [
             email,
         ],  # to emails
+        connection=get_mail_connection(),
     )
 
 
-def user_registration_email(request, user, to_email, password):
+@task
+def user_registration_email(user_id, to_email, protocol="https"):
+    user = User.objects.get(pk=user_id)
     current_site = Site.objects.get_current()
     domain = current_site.domain
     activation_url = reverse(
@@ -33,17 +38,15 @@ def user_registration_email(request, user, to_email, password):
         },
     )
     full_activation_url = f"{domain}{activation_url}"
-    # activation_url = f"{domain}users/activate/{urlsafe_base64_encode(force_bytes(user.pk))}/{account_activation_token.make_token(user)}"
     subject = "Activate your account"
     html_message = render_to_string(
         "users/emails/user_registration_email.html",
         {
             "user": user.username,
-            "password": password,
             "domain": domain,
             "uid": urlsafe_base64_encode(force_bytes(user.pk)),
             "token": account_activation_token.make_token(user),
-            "protocol": "https" if request.is_secure() else "http",
+            "protocol": protocol,
             "full_activation_url": full_activation_url,
         },
     )
@@ -58,14 +61,5 @@ def user_registration_email(request, user, to_email, password):
             settings.DEFAULT_FROM_EMAIL,
         ],
         html_message=html_message,
+        connection=get_mail_connection(),
     )
-    if send_mail:
-        messages.success(
-            request,
-            "An email has been sent to your email address. Please check your email to activate your account.",
-        )
-    else:
-        messages.error(
-            request,
-            "An error occurred while sending the email. Please try again later.",
-        )
\ No newline at end of file
@@ -1,3 +1,113 @@
-from django.test import TestCase
+from django.contrib.auth import authenticate
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from .models import User
+
+
+# What settings use with Redis. LocMemCache is shared within the test run.
+shared_cache = override_settings(
+    SESSION_ENGINE="django.contrib.sessions.backends.cached_db",
+    AUTH_USER_CACHE_TIMEOUT=300,
+    AUTH_UNKNOWN_IDENTIFIER_TIMEOUT=60,
+)
+
+
+@shared_cache
+class EmailOrUsernameBackendTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="Registry", email="Registry@Example.com", password="secret"
+        )
+
+    def test_username_or_email_in_any_case(self):
+        for identifier in ["registry", "REGISTRY", " registry@example.COM "]:
+            with self.assertNumQueries(1):
+                self.assertEqual(
+                    authenticate(username=identifier, password="secret"), self.user
+                )
+
+    def test_wrong_password_or_inactive(self):
+        self.assertIsNone(authenticate(username="registry", password="wrong"))
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(authenticate(username="registry", password="secret"))
+
+    def test_unknown_identifier_is_cached(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(authenticate(username="nobody", password="secret"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(authenticate(username="Nobody", password="secret"))
+
+        # Creating the account forgets the cached miss.
+        user = User.objects.create_user(
+            username="nobody", email="nobody@example.com", password="secret"
+        )
+        self.assertEqual(authenticate(username="nobody", password="secret"), user)
+
+
+@shared_cache
+class CachedUserTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="registry",
+            email="registry@example.com",
+            password="secret",
+            is_creator=True,
+        )
+        self.client.force_login(self.user)
+
+    def load_user(self):
+        response = self.client.get(reverse("incoming-list"))
+        return response.wsgi_request.user
+
+    def test_warm_cache_needs_no_auth_queries(self):
+        self.load_user()
+        with CaptureQueriesContext(connection) as context:
+            user = self.load_user()
+        self.assertEqual(user, self.user)
+        self.assertFalse(
+            [
+                query
+                for query in context.captured_queries
+                if 'FROM "django_session"' in query["sql"]
+                or 'FROM "users_user"' in query["sql"]
+            ]
+        )
+
+    def test_save_clears_cached_user(self):
+        self.load_user()
+        self.user.first_name = "Renamed"
+        self.user.save()
+        self.assertEqual(self.load_user().first_name, "Renamed")
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.load_user().is_authenticated)
+
+    def test_update_clears_cached_user(self):
+        self.load_user()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertFalse(self.load_user().is_authenticated)
+
+    @override_settings(
+        SESSION_ENGINE="django.contrib.sessions.backends.db",
+        AUTH_USER_CACHE_TIMEOUT=0,
+    )
+    def test_not_cached_without_a_shared_cache(self):
+        self.client.force_login(self.user)
+        self.load_user()
+        with CaptureQueriesContext(connection) as context:
+            self.load_user()
+        self.assertTrue(
+            [
+                query
+                for query in context.captured_queries
+                if 'FROM "users_user"' in query["sql"]
+            ]
+        )
@@ -18,3 +18,13 @@ class AdminAccessMixin(LoginRequiredMixin, UserPassesTestMixin):
     def handle_no_permission(self):
         messages.info(self.request, "Your request could not be completed.")
         return redirect("login")
+
+
+class ManagerAccessMixin(LoginRequiredMixin, UserPassesTestMixin):
+    def test_func(self):
+        user = self.request.user
+        return user.is_manager or user.is_admin or user.is_superuser
+
+    def handle_no_permission(self):
+        messages.info(self.request, "Your request could not be completed.")
+        return redirect("login")
@@ -1,4 +1,3 @@
-import threading
 from urllib.parse import urlencode
 
 from django.contrib import messages
@@ -124,11 +123,7 @@ def forgot_password_view(request):
                     "reset_link": reset_link,
                 },
             )
-            forgot_password_email_thread = threading.Thread(
-                target=forgot_password_email,
-                args=(email, user, reset_link, message, subject),
-            )
-            forgot_password_email_thread.start()
+            forgot_password_email.enqueue(email, subject, message)
 
             messages.success(
                 request, "A password reset link has been sent to your email."
@@ -256,17 +251,11 @@ def user_registration_view(request):
         if form.is_valid():
             user = form.save(commit=False)
             to_email = form.cleaned_data.get("email")
-            password = form.cleaned_data.get("password1")
             user.is_active = False
             user.save()
-            # user_registration_email.after_response(
-            #     request, user, form.cleaned_data["email"]
-            # )
-            user_registration_email_thread = threading.Thread(
-                target=user_registration_email,
-                args=(request, user, to_email, password),
+            user_registration_email.enqueue(
+                user.pk, to_email, "https" if request.is_secure() else "http"
             )
-            user_registration_email_thread.start()
             messages.success(
                 request,
                 "Confirmation email has been sent to the email address.",